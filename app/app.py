@@ -1,8 +1,8 @@
 import streamlit as st
-from modified_form import FormAssistantService
+from ui_cache import get_service, set_scope, clear_session_cache, cached_user_info, cached_form_analysis
 
-# Initialize the form assistant service
-assistant = FormAssistantService()
+# Shared by every session and rerun instead of rebuilt per script run
+assistant = get_service('modified_form')
 
 def main():
     st.title("🏛️ AI Government Form Assistant")
@@ -52,6 +52,9 @@ def main():
     
     form_type = agency_form_map[selected_agency]
 
+    # Memoized results follow the verified SSN and the selected agency
+    set_scope(st.session_state.verified_ssn, form_type)
+
     # SSN Verification (only once)
     if not st.session_state.verified_ssn:
         st.header(f"{st.session_state.current_mode} Mode - {selected_agency}")
@@ -63,7 +66,7 @@ def main():
                 return
 
             # Retrieve user info
-            user_info = assistant.retrieve_user_info(ssn)
+            user_info = cached_user_info(assistant, ssn)
 
             if "message" not in user_info and "error" not in user_info:
                 st.session_state.verified_ssn = ssn
@@ -76,12 +79,15 @@ def main():
         # Apply Mode
         if st.session_state.current_mode == 'Apply':
             if not st.session_state.show_assistance_chat:
-                # Retrieve user info again (could cache this earlier)
-                user_info = assistant.retrieve_user_info(st.session_state.verified_ssn)
+                # Looked up once at verification and reused across reruns
+                user_info = cached_user_info(assistant, st.session_state.verified_ssn)
 
                 # Analyze form requirements
                 if "message" not in user_info and "error" not in user_info:
-                    form_analysis = assistant.analyze_form_requirements(user_info, form_type)
+                    # One LLM call per SSN and form type, not one per click
+                    form_analysis = cached_form_analysis(
+                        assistant, st.session_state.verified_ssn, user_info, form_type
+                    )
                     
                     st.header(f"Apply for {selected_agency} Form")
                     st.subheader("Form Analysis")
@@ -130,27 +136,28 @@ def main():
                     'content': user_input
                 })
                 
-                # Get guidance from assistant
-                guidance = assistant.ask_form_guidance(
-                    form_type, 
-                    user_input
-                )
+                st.chat_message("user").write(user_input)
+                
+                # Stream guidance from assistant as it is generated
+                with st.chat_message("assistant"):
+                    response = st.write_stream(
+                        assistant.stream_form_guidance(form_type, user_input)
+                    )
                 
-                # Add assistant response to chat history
-                response = guidance.get('guidance', 'I apologize, but I cannot provide a specific answer at this moment.')
+                # Add assistant response to chat history once complete
+                if not response:
+                    response = 'I apologize, but I cannot provide a specific answer at this moment.'
                 st.session_state.chat_history.append({
                     'role': 'assistant', 
                     'content': response
                 })
-                
-                # Rerun to display the new messages
-                st.experimental_rerun()
 
         # Reset SSN Verification Button
         if st.sidebar.button("Reset SSN Verification"):
             st.session_state.verified_ssn = None
             st.session_state.show_assistance_chat = False
             st.session_state.chat_history = []
+            clear_session_cache()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
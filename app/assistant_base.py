@@ -0,0 +1,357 @@
+"""
+LLM plumbing shared by the form assistant services.
+
+BaseFormAssistantService holds the Grok client, database pool, caches and
+resilient caller, the user lookups, and the analysis, guidance and review
+calls. form_assistance.FormAssistantService adds document processing on
+top; modified_form.FormAssistantService is the lighter service app.py uses.
+"""
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from db import get_pool, find_user, find_users_bulk, BULK_LOOKUP_CHUNK_SIZE
+from response_cache import ResponseCache, make_key
+from guidance_cache import get_guidance_cache
+from single_flight import get_single_flight, request_fingerprint
+from resilience import get_resilient_caller
+from metrics import GUIDANCE_TTFT, CALL_ERRORS, LLM_COALESCED, instrument, record_usage, record_cache, start_metrics_exporter
+from tax_history import user_tax_summary, format_summary
+from review_screening import screen_submission, ROUTINE_REVIEW_ANALYSIS
+from prompts import ANALYSIS_PROMPT, GUIDANCE_PROMPT, REVIEW_PROMPT
+
+load_dotenv()
+
+# Point at a local OpenAI-compatible server (e.g. scripts/llm_stub_server.py)
+# to run without the X.AI API
+XAI_BASE_URL = os.getenv('XAI_BASE_URL', 'https://api.x.ai/v1')
+
+
+class BaseFormAssistantService:
+    def __init__(self, api_key=None, base_url=None):
+        """
+        Initialize Grok client with X.AI endpoint, the database pool and the
+        response caches
+        """
+        self.api_key = api_key or os.getenv('XAI_API_KEY')
+        self.base_url = base_url or XAI_BASE_URL
+        try:
+            self.client = self._create_client()
+        except Exception as e:
+            print(f"Failed to initialize client: {e}")
+            self.client = None
+        
+        self.db_path = 'tax_data.db'
+        self.db_pool = get_pool(self.db_path)
+
+        try:
+            self.response_cache = ResponseCache()
+        except sqlite3.Error as e:
+            print(f"Failed to open response cache: {e}")
+            self.response_cache = None
+
+        self.guidance_cache = get_guidance_cache()
+
+        self.single_flight = get_single_flight()
+        self.resilience = get_resilient_caller()
+
+        start_metrics_exporter()
+
+    def _create_client(self):
+        # Retries are handled by the resilient caller, with jitter
+        return OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0
+        )
+
+    def _chat(self, method, form_type, messages, **kwargs):
+        """
+        Single entry point for chat completions, so every call is timed and
+        its token usage recorded under the calling method and form type.
+        """
+        if kwargs.get("stream") or not self.single_flight:
+            return self._create_completion(method, form_type, messages, **kwargs)
+
+        # Identical requests already in flight share one upstream call
+        key = request_fingerprint("grok-beta", messages, **kwargs)
+        response, shared = self.single_flight.do(
+            key, lambda: self._create_completion(method, form_type, messages, **kwargs)
+        )
+        if shared:
+            LLM_COALESCED.inc(method=method, form_type=form_type)
+        return response
+
+    def _llm_available(self):
+        """
+        False without a client or while the upstream circuit is open, so
+        callers fail fast to the mock responses.
+        """
+        return bool(self.client) and not self.resilience.breaker.is_open()
+
+    def _mock_analysis(self, form_type):
+        # "mock" marks placeholder results, which callers must not memoize
+        return {
+            "analysis": f"Mock analysis for {form_type} form. Requires additional documents: Birth Certificate, Proof of Income",
+            "mock": True
+        }
+
+    def _mock_guidance(self, form_type):
+        return f"Mock guidance for {form_type}. Please consult official documentation for specific details."
+
+    def _create_completion(self, method, form_type, messages, **kwargs):
+        with instrument('llm', method, form_type):
+            response = self.resilience.call(
+                method,
+                lambda timeout: self.client.chat.completions.create(
+                    model="grok-beta",
+                    messages=messages,
+                    timeout=timeout,
+                    **kwargs
+                ),
+                # A stream can't be raced: the caller consumes whichever it gets
+                hedge=not kwargs.get("stream")
+            )
+        if not kwargs.get("stream"):
+            record_usage(response.usage, method, form_type)
+        return response
+
+    def retrieve_user_info(self, ssn):
+        """
+        Retrieve user information from the database.
+        """
+        try:
+            with instrument('db', 'retrieve_user_info'):
+                result = find_user(self.db_pool, ssn)
+            
+            if result:
+                return {
+                    'name': result[0],
+                    'email': result[1],
+                    'address': result[2]
+                }
+            else:
+                return {"message": "User not registered. Please register your details first."}
+        
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return {"error": "Database error occurred. Please try again later."}
+
+    def retrieve_users_bulk(self, ssns, chunk_size=BULK_LOOKUP_CHUNK_SIZE, on_not_found=None):
+        """
+        Resolve many SSNs over one connection for back-office batch jobs.
+
+        Yields (ssn, user_info) for every registered SSN, in input order.
+        SSNs with no matching user are passed to `on_not_found(ssn)`
+        instead of being yielded.
+        """
+        try:
+            for ssn, result in find_users_bulk(self.db_pool, ssns, chunk_size):
+                if result:
+                    yield ssn, {
+                        'name': result[0],
+                        'email': result[1],
+                        'address': result[2]
+                    }
+                elif on_not_found is not None:
+                    on_not_found(ssn)
+        
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            raise
+
+    def get_tax_history_summary(self, ssn):
+        """
+        Compact income/tax history summary for the analysis prompt, or None
+        if it can't be loaded.
+        """
+        try:
+            with instrument('db', 'get_tax_history_summary'):
+                records = user_tax_summary(self.db_pool, ssn)
+            return format_summary(records)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+
+    def analyze_form_requirements(self, user_info, form_type, tax_summary=None):
+        """
+        Analyze form requirements, with mock data if no AI client and
+        nothing cached
+        """
+        cache_key = make_key('analysis', form_type, {"user_info": user_info, "tax_summary": tax_summary})
+        if self.response_cache:
+            cached = self.response_cache.get(cache_key)
+            record_cache('response', 'analyze_form_requirements', form_type, cached is not None)
+            if cached is not None:
+                return {"analysis": cached}
+
+        if not self._llm_available():
+            return self._mock_analysis(form_type)
+
+        try:
+            response = self._chat(
+                'analyze_form_requirements', form_type,
+                self._analysis_messages(user_info, form_type, tax_summary)
+            )
+            
+            analysis = response.choices[0].message.content
+            if self.response_cache:
+                self.response_cache.set(cache_key, analysis)
+            
+            return {
+                "analysis": analysis
+            }
+        
+        except Exception as e:
+            print(f"Error in AI analysis: {e}")
+            return {
+                "error": "Unable to process form requirements automatically."
+            }
+
+    def ask_form_guidance(self, form_type, user_question):
+        """
+        Provide mock guidance if no AI client and nothing cached
+        """
+        cached = self.guidance_cache.get(form_type, user_question)
+        record_cache('guidance', 'ask_form_guidance', form_type, cached is not None)
+        if cached is not None:
+            return {"guidance": cached}
+
+        if not self._llm_available():
+            return {"guidance": self._mock_guidance(form_type), "mock": True}
+
+        try:
+            response = self._chat(
+                'ask_form_guidance', form_type,
+                self._guidance_messages(form_type, user_question)
+            )
+            
+            guidance = response.choices[0].message.content
+            self.guidance_cache.set(form_type, user_question, guidance)
+            
+            return {
+                "guidance": guidance
+            }
+        
+        except Exception as e:
+            print(f"Error in form guidance generation: {e}")
+            return {
+                "error": "Unable to generate form guidance automatically."
+            }
+
+    def stream_form_guidance(self, form_type, user_question):
+        """
+        Streaming variant of ask_form_guidance that yields answer text as
+        tokens arrive. The full answer is cached once the stream completes.
+        """
+        cached = self.guidance_cache.get(form_type, user_question)
+        record_cache('guidance', 'stream_form_guidance', form_type, cached is not None)
+        if cached is not None:
+            yield cached
+            return
+
+        if not self._llm_available():
+            yield self._mock_guidance(form_type)
+            return
+
+        parts = []
+        stream = None
+        try:
+            started = time.perf_counter()
+            stream = self._chat(
+                'stream_form_guidance', form_type,
+                self._guidance_messages(form_type, user_question),
+                stream=True
+            )
+            
+            for chunk in stream:
+                # Servers that report usage on streams send it on the last chunk
+                if getattr(chunk, 'usage', None):
+                    record_usage(chunk.usage, 'stream_form_guidance', form_type)
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if not token:
+                    continue
+                if not parts:
+                    GUIDANCE_TTFT.observe(time.perf_counter() - started)
+                parts.append(token)
+                yield token
+        
+        except Exception as e:
+            print(f"Error in form guidance streaming: {e}")
+            if stream is not None:
+                # Failures opening the stream are already counted by _chat
+                CALL_ERRORS.inc(kind='llm', method='stream_form_guidance', form_type=form_type)
+            if not parts:
+                yield "Unable to generate form guidance automatically."
+            return
+
+        self.guidance_cache.set(form_type, user_question, "".join(parts))
+
+    def _screen_for_review(self, form_data, ssn=None):
+        """
+        Local anomaly screen of a submission, or None if it can't be run
+        """
+        try:
+            with instrument('db', 'determine_review_necessity', form_data.get('form_type', '')):
+                return screen_submission(self.db_pool, form_data, ssn)
+        except Exception as e:
+            print(f"Error in review screening: {e}")
+            return None
+
+    def _review_without_llm(self, screening):
+        """
+        The review result when the LLM isn't needed or isn't available,
+        otherwise None
+        """
+        if screening is not None and not screening["review"]:
+            return {"review_analysis": ROUTINE_REVIEW_ANALYSIS, "screening": screening}
+
+        # Provide mock review necessity if no AI client
+        if not self._llm_available():
+            return {
+                "review_analysis": "Based on the submitted information, this form may require manual review. Please be prepared to provide additional documentation if requested.",
+                "screening": screening,
+                "mock": True
+            }
+        return None
+
+    def determine_review_necessity(self, form_data, ssn=None):
+        """
+        Screen the submission locally and only ask the LLM about the ones
+        that stand out. `ssn` adds the filer's tax history to the screen.
+        """
+        screening = self._screen_for_review(form_data, ssn)
+        result = self._review_without_llm(screening)
+        if result is not None:
+            return result
+
+        try:
+            response = self._chat(
+                'determine_review_necessity', form_data.get('form_type', ''),
+                self._review_messages(form_data, screening)
+            )
+            
+            return {
+                "review_analysis": response.choices[0].message.content,
+                "screening": screening
+            }
+        
+        except Exception as e:
+            print(f"Error in review determination: {e}")
+            return {
+                "error": "Unable to automatically assess form"
+            }
+
+    def _analysis_messages(self, user_info, form_type, tax_summary=None):
+        return ANALYSIS_PROMPT.render(form_type, user_info=user_info, tax_summary=tax_summary or "Not available.")
+
+    def _guidance_messages(self, form_type, user_question):
+        return GUIDANCE_PROMPT.render(form_type, user_question=user_question)
+
+    def _review_messages(self, form_data, screening=None):
+        flags = "; ".join(screening["reasons"]) if screening else None
+        return REVIEW_PROMPT.render(form_data.get('form_type', ''), flags=flags, form_data=form_data)
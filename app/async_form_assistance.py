@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import asyncio
+from typing import Dict, List, Any
+from contextlib import ExitStack
+from openai import AsyncOpenAI
+
+from form_assistance import FormAssistantService
+from document_ingestion import SUPPORTED_EXTENSIONS
+from document_cache import content_digest
+from blob_store import BlobRef, BlobExpiredError
+from chunking import chunk_text, merge_extractions
+from response_cache import make_key
+from single_flight import AsyncSingleFlight, request_fingerprint
+from metrics import GUIDANCE_TTFT, CALL_ERRORS, LLM_COALESCED, instrument, record_usage, record_cache
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+
+
+class AsyncFormAssistantService(FormAssistantService):
+    def __init__(self, api_key=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, base_url=None):
+        """
+        asyncio-native variant of FormAssistantService.
+
+        All LLM calls go through an AsyncOpenAI client and share one
+        semaphore, so a single process can keep up to `max_concurrency`
+        requests in flight without blocking a thread per call.
+        """
+        super().__init__(api_key, base_url)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Coroutines can't wait on the thread-based group without blocking
+        # the loop, so async calls coalesce within this service's own group
+        self._async_single_flight = AsyncSingleFlight()
+
+    def _create_client(self):
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0
+        )
+
+    async def _complete(self, method, form_type, messages, **kwargs):
+        if not self.single_flight:
+            return await self._create_completion(method, form_type, messages, **kwargs)
+
+        key = request_fingerprint("grok-beta", messages, **kwargs)
+        content, shared = await self._async_single_flight.do(
+            key, lambda: self._create_completion(method, form_type, messages, **kwargs)
+        )
+        if shared:
+            LLM_COALESCED.inc(method=method, form_type=form_type)
+        return content
+
+    async def _create_completion(self, method, form_type, messages, **kwargs):
+        async with self._semaphore:
+            with instrument('llm', method, form_type):
+                response = await self.resilience.acall(
+                    method,
+                    lambda timeout: self.client.chat.completions.create(
+                        model="grok-beta",
+                        messages=messages,
+                        timeout=timeout,
+                        **kwargs
+                    )
+                )
+        record_usage(response.usage, method, form_type)
+        return response.choices[0].message.content
+
+    async def retrieve_user_info(self, ssn):
+        """
+        Run the pooled database lookup off the event loop
+        """
+        return await asyncio.to_thread(super().retrieve_user_info, ssn)
+
+    async def get_tax_history_summary(self, ssn):
+        return await asyncio.to_thread(super().get_tax_history_summary, ssn)
+
+    async def analyze_form_requirements(self, user_info, form_type, tax_summary=None):
+        """
+        Analyze form requirements, with mock data if no AI client and
+        nothing cached
+        """
+        cache_key = make_key('analysis', form_type, {"user_info": user_info, "tax_summary": tax_summary})
+        if self.response_cache:
+            # SQLite-backed, and get() writes access stats: keep it off the event loop
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            record_cache('response', 'analyze_form_requirements', form_type, cached is not None)
+            if cached is not None:
+                return {"analysis": cached}
+
+        if not self._llm_available():
+            return self._mock_analysis(form_type)
+
+        try:
+            analysis = await self._complete(
+                'analyze_form_requirements', form_type,
+                self._analysis_messages(user_info, form_type, tax_summary)
+            )
+            if self.response_cache:
+                await asyncio.to_thread(self.response_cache.set, cache_key, analysis)
+            return {
+                "analysis": analysis
+            }
+        except Exception as e:
+            print(f"Error in AI analysis: {e}")
+            return {
+                "error": "Unable to process form requirements automatically."
+            }
+
+    async def ask_form_guidance(self, form_type, user_question):
+        """
+        Provide mock guidance if no AI client and nothing cached
+        """
+        cached = self.guidance_cache.get(form_type, user_question)
+        record_cache('guidance', 'ask_form_guidance', form_type, cached is not None)
+        if cached is not None:
+            return {"guidance": cached}
+
+        if not self._llm_available():
+            return {"guidance": self._mock_guidance(form_type), "mock": True}
+
+        try:
+            guidance = await self._complete(
+                'ask_form_guidance', form_type, self._guidance_messages(form_type, user_question)
+            )
+            self.guidance_cache.set(form_type, user_question, guidance)
+            return {
+                "guidance": guidance
+            }
+        except Exception as e:
+            print(f"Error in form guidance generation: {e}")
+            return {
+                "error": "Unable to generate form guidance automatically."
+            }
+
+    async def astream_form_guidance(self, form_type, user_question):
+        """
+        Async generator yielding guidance tokens as they arrive
+        """
+        cached = self.guidance_cache.get(form_type, user_question)
+        record_cache('guidance', 'stream_form_guidance', form_type, cached is not None)
+        if cached is not None:
+            yield cached
+            return
+
+        if not self._llm_available():
+            yield self._mock_guidance(form_type)
+            return
+
+        parts = []
+        stream = None
+        try:
+            started = time.perf_counter()
+            async with self._semaphore:
+                with instrument('llm', 'stream_form_guidance', form_type):
+                    stream = await self.resilience.acall(
+                        'stream_form_guidance',
+                        lambda timeout: self.client.chat.completions.create(
+                            model="grok-beta",
+                            messages=self._guidance_messages(form_type, user_question),
+                            stream=True,
+                            timeout=timeout
+                        ),
+                        hedge=False
+                    )
+                async for chunk in stream:
+                    if getattr(chunk, 'usage', None):
+                        record_usage(chunk.usage, 'stream_form_guidance', form_type)
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if not token:
+                        continue
+                    if not parts:
+                        GUIDANCE_TTFT.observe(time.perf_counter() - started)
+                    parts.append(token)
+                    yield token
+        except Exception as e:
+            print(f"Error in form guidance streaming: {e}")
+            if stream is not None:
+                CALL_ERRORS.inc(kind='llm', method='stream_form_guidance', form_type=form_type)
+            if not parts:
+                yield "Unable to generate form guidance automatically."
+            return
+
+        self.guidance_cache.set(form_type, user_question, "".join(parts))
+
+    async def determine_review_necessity(self, form_data, ssn=None):
+        """
+        Screen the submission locally and only ask the LLM about the ones
+        that stand out
+        """
+        screening = await asyncio.to_thread(self._screen_for_review, form_data, ssn)
+        result = self._review_without_llm(screening)
+        if result is not None:
+            return result
+
+        try:
+            return {
+                "review_analysis": await self._complete(
+                    'determine_review_necessity', form_data.get('form_type', ''),
+                    self._review_messages(form_data, screening)
+                ),
+                "screening": screening
+            }
+        except Exception as e:
+            print(f"Error in review determination: {e}")
+            return {
+                "error": "Unable to automatically assess form"
+            }
+
+    async def _process_one(self, userInfo, file_name, file_content, form_type, digest):
+        file_extension = file_name.split('.')[-1].lower()
+        # PDF parsing and OCR are blocking, keep them off the event loop
+        text = await asyncio.to_thread(self._extract_text, file_extension, file_content, digest, form_type)
+
+        if self.document_cache:
+            cached = await asyncio.to_thread(self.document_cache.get_extraction, digest, form_type, userInfo)
+            record_cache('document_extraction', 'process_document_upload', form_type, cached is not None)
+            if cached is not None:
+                return cached
+
+        chunks = chunk_text(text, self._chunk_tokens(userInfo, form_type))
+        partials = await asyncio.gather(*(
+            self._complete(
+                'process_document_upload', form_type,
+                self._extraction_messages(userInfo, chunk, form_type),
+                response_format={"type": "json_object"}
+            )
+            for chunk in chunks
+        ))
+        partials = [json.loads(content) for content in partials]
+        parsed_info = partials[0] if len(partials) == 1 else merge_extractions(partials)
+        if self.document_cache:
+            await asyncio.to_thread(self.document_cache.set_extraction, digest, form_type, parsed_info, userInfo)
+        return parsed_info
+
+    async def process_document_upload(self, userInfo, uploaded_files: List[Any], form_type: str) -> Dict[str, Any]:
+        """
+        Document processing with every file extracted concurrently
+        """
+        if not self.client:
+            return super().process_document_upload(userInfo, uploaded_files, form_type)
+
+        uploads = []
+        seen_digests = set()
+        with ExitStack() as stack:
+            for uploaded_file in uploaded_files:
+                file_name = uploaded_file.name
+                file_extension = file_name.split('.')[-1].lower()
+                if file_extension not in SUPPORTED_EXTENSIONS:
+                    return {
+                        "status": "error",
+                        "message": f"Unsupported file type: {file_extension}"
+                    }
+                if isinstance(uploaded_file, BlobRef):
+                    try:
+                        # Memory-mapped from the blob store, already hashed
+                        file_content = stack.enter_context(self.blob_store.open(uploaded_file))
+                    except BlobExpiredError as e:
+                        return {
+                            "status": "error",
+                            "message": str(e)
+                        }
+                    digest = uploaded_file.key
+                else:
+                    file_content = uploaded_file.read()
+                    digest = content_digest(file_content)
+                # The same file uploaded twice in one batch adds nothing new
+                if digest not in seen_digests:
+                    seen_digests.add(digest)
+                    uploads.append((file_name, file_content, digest))
+
+            results = await asyncio.gather(
+                *(self._process_one(userInfo, name, content, form_type, digest) for name, content, digest in uploads),
+                return_exceptions=True
+            )
+
+        # Merge in upload order so later files win, as in the sequential path
+        extracted_info = {}
+        for (file_name, _, _), result in zip(uploads, results):
+            if isinstance(result, Exception):
+                return {
+                    "status": "error",
+                    "message": f"Error processing {file_name}: {str(result)}"
+                }
+            extracted_info.update(result)
+
+        return {
+            "status": "success",
+            "message": "Documents processed successfully",
+            "extracted_info": extracted_info
+        }
+
+    async def analyze_and_review(self, user_info, form_type, form_data, tax_summary=None, ssn=None):
+        """
+        Run form analysis and review assessment concurrently instead of
+        waiting for each round trip in turn.
+        """
+        analysis, review = await asyncio.gather(
+            self.analyze_form_requirements(user_info, form_type, tax_summary),
+            self.determine_review_necessity(form_data, ssn)
+        )
+        return {"analysis": analysis, "review": review}
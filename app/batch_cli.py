@@ -0,0 +1,234 @@
+"""
+Headless batch processing for mailed-in document packets.
+
+Each manifest line describes one packet: the applicant's SSN, the form type
+and a directory of scanned documents. For every packet the pipeline runs
+retrieve -> extract -> analyze -> review and appends one JSON line to the
+output file. The output doubles as the checkpoint: rerunning the same
+command skips packets that already have a result. Extracted document
+values are not written, only which fields each file yielded, and anything
+SSN-shaped in the LLM's answers is masked.
+
+Usage:
+    python app/batch_cli.py manifest.jsonl --output results.jsonl --workers 16
+
+Manifest format (JSONL, or CSV with the same column names):
+    {"id": "pkt-0001", "ssn": "123-45-6789", "form_type": "tax-return", "documents": "packets/0001"}
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import re
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from db import hash_ssn
+from form_assistance import FormAssistantService
+from document_ingestion import SUPPORTED_EXTENSIONS
+from form_validation import SSN_RE
+
+# SSN_RE is anchored by fullmatch() in validation; in free text it must not
+# start or end inside a longer number
+SSN_TEXT_RE = re.compile(rf"(?<!\d){SSN_RE.pattern}(?!\d)")
+
+
+def read_manifest(path):
+    """
+    Yield manifest entries from a JSONL or CSV file, one at a time.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def item_id(entry):
+    # The output must not carry the SSN, so the fallback id uses its hash
+    return entry.get('id') or f"{hash_ssn(entry['ssn'])[:16]}:{entry['form_type']}:{entry.get('documents', '')}"
+
+
+def _kept_result(line, retry_failed):
+    """
+    The parsed result line, or None when it is dropped from the checkpoint.
+    """
+    try:
+        result = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if retry_failed and result.get('status') == 'error':
+        return None
+    return result
+
+
+def load_checkpoint(output_path, retry_failed=False):
+    """
+    Ids already present in the output file. Lines for packets that will run
+    again are removed from the file first, so every id appears once and new
+    results are appended after a complete line: a line cut short by an
+    interrupted write and, with retry_failed, previous errors.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    rewrite = False
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            result = _kept_result(line, retry_failed)
+            if result is None or not line.endswith('\n'):
+                rewrite = True
+            if result is not None:
+                done.add(result['id'])
+
+    if rewrite:
+        tmp_path = f"{output_path}.tmp"
+        with open(output_path, encoding='utf-8') as f, open(tmp_path, 'w', encoding='utf-8') as out:
+            for line in f:
+                if _kept_result(line, retry_failed) is not None:
+                    out.write(line if line.endswith('\n') else line + '\n')
+        os.replace(tmp_path, output_path)
+    return done
+
+
+def document_paths(directory):
+    if not directory:
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.split('.')[-1].lower() in SUPPORTED_EXTENSIONS
+    )
+
+
+def redact_ssns(value):
+    """
+    Copy of an LLM result with SSN-shaped numbers in its strings masked.
+    """
+    if isinstance(value, str):
+        return SSN_TEXT_RE.sub("***-**-****", value)
+    if isinstance(value, dict):
+        return {key: redact_ssns(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact_ssns(item) for item in value]
+    return value
+
+
+def document_summary(extracted):
+    """
+    The document stage for the output file: status and per-file outcomes,
+    with the names of the extracted fields but not their values (W-2s carry
+    employee SSNs).
+    """
+    summary = {key: value for key, value in extracted.items() if key not in ("extracted_info", "files")}
+    summary["fields"] = sorted(extracted.get("extracted_info", {}))
+    if "files" in extracted:
+        summary["files"] = [
+            dict({key: value for key, value in file.items() if key != "extracted_info"},
+                 fields=sorted(file.get("extracted_info", {})))
+            for file in extracted["files"]
+        ]
+    return summary
+
+
+def process_packet(assistant, entry):
+    """
+    Run the full pipeline for one manifest entry and return its result line.
+    """
+    started = time.perf_counter()
+    result = {"id": item_id(entry), "ssn_hash": hash_ssn(entry['ssn']), "form_type": entry['form_type']}
+
+    user_info = assistant.retrieve_user_info(entry['ssn'])
+    if "message" in user_info or "error" in user_info:
+        result.update(status="error", stage="retrieve", message=user_info.get("message") or user_info.get("error"))
+        return result
+
+    extracted = {"status": "success", "extracted_info": {}}
+    paths = document_paths(entry.get('documents'))
+    if paths:
+        with ExitStack() as stack:
+            files = [stack.enter_context(open(path, 'rb')) for path in paths]
+            extracted = assistant.process_document_upload(user_info, files, entry['form_type'], parallel=True)
+    result["documents"] = redact_ssns(document_summary(extracted))
+
+    tax_summary = assistant.get_tax_history_summary(entry['ssn'])
+    # The LLM sees the SSN in user_info and may quote it back
+    result["analysis"] = redact_ssns(assistant.analyze_form_requirements(user_info, entry['form_type'], tax_summary))
+
+    form_data = dict(user_info, **extracted.get("extracted_info", {}))
+    result["review"] = redact_ssns(assistant.determine_review_necessity(form_data, entry['ssn']))
+
+    failed = [step for step in ("analysis", "review") if "error" in result[step]]
+    if extracted.get("status") == "error":
+        failed.append("documents")
+    result["status"] = "error" if failed else ("partial" if extracted.get("status") == "partial" else "success")
+    if failed:
+        result["failed_steps"] = failed
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run(manifest, output, workers=8, retry_failed=False):
+    done = load_checkpoint(output, retry_failed)
+    assistant = FormAssistantService()
+    counts = {"success": 0, "partial": 0, "error": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    def safe_process(entry):
+        try:
+            return process_packet(assistant, entry)
+        except Exception as e:
+            return {"id": item_id(entry), "status": "error", "stage": "pipeline", "message": str(e)}
+
+    with open(output, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        # Results are only written from this thread, as futures complete
+        def write(result):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            processed = sum(counts.values()) - counts["skipped"]
+            print(f"\r{processed:,} processed, {counts['skipped']:,} skipped, {counts['error']:,} errors",
+                  end="", file=sys.stderr, flush=True)
+
+        # Keep a bounded number of packets in flight so memory stays flat
+        # on very large manifests
+        pending = set()
+        for entry in read_manifest(manifest):
+            if item_id(entry) in done:
+                counts["skipped"] += 1
+                continue
+            pending.add(executor.submit(safe_process, entry))
+            if len(pending) >= workers * 4:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+        for future in wait(pending).done:
+            write(future.result())
+
+    elapsed = time.perf_counter() - started
+    processed = sum(counts.values()) - counts["skipped"]
+    print(f"\nDone in {elapsed:.1f}s: {counts['success']:,} succeeded, {counts['partial']:,} partial, "
+          f"{counts['error']:,} failed, {counts['skipped']:,} already done "
+          f"({processed / elapsed if elapsed else 0:,.1f} packets/s)", file=sys.stderr)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest")
+    parser.add_argument("--output", "-o", default="batch_results.jsonl")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--retry-failed", action="store_true", help="rerun packets whose previous result was an error")
+    args = parser.parse_args()
+
+    counts = run(args.manifest, args.output, args.workers, args.retry_failed)
+    sys.exit(1 if counts.get("error") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Content-addressed store for uploaded documents on local disk.
+
+Uploads are spooled to disk in fixed-size chunks while being hashed, so
+an upload is never held in memory whole. Session state keeps only a small
+BlobRef (name, size, SHA-256 key). Readers get a read-only memory map of
+the stored file, which parsers can seek and read without copying it into
+the Python heap.
+
+Identical uploads share one file. Because of that, a session cannot
+delete the files it used. Each blob instead expires once nothing has
+written or opened it for `ttl` seconds, and expired blobs are swept on
+later writes.
+"""
+import os
+import mmap
+import time
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+DEFAULT_BLOB_DIR = os.getenv('BLOB_STORE_DIR', '.blob_store')
+DEFAULT_BLOB_TTL = float(os.getenv('BLOB_TTL_SECONDS', str(24 * 3600)))
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobExpiredError(FileNotFoundError):
+    pass
+
+
+class BlobRef(namedtuple('BlobRef', ('name', 'size', 'key'))):
+    """
+    Handle for a stored upload; `key` is the SHA-256 of its bytes.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return self.name
+
+
+class BlobStore:
+    def __init__(self, root=DEFAULT_BLOB_DIR, ttl=DEFAULT_BLOB_TTL):
+        """
+        :param ttl: seconds since a blob was last written or opened before
+            it may be swept
+        """
+        self.root = root
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, stream, name):
+        """
+        Spool a readable stream to disk chunk by chunk and return its BlobRef.
+        The stream is read from its current position.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            key = digest.hexdigest()
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                # Already stored; just keep it alive
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._maybe_sweep()
+        return BlobRef(name, size, key)
+
+    @contextmanager
+    def open(self, ref):
+        """
+        Yield a read-only memory map of the blob. It supports read(),
+        seek() and slicing, and is closed when the block exits. Raises
+        BlobExpiredError when the blob has been swept; once open, a sweep
+        can no longer take it away.
+        """
+        path = self.path(ref.key)
+        try:
+            os.utime(path)
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            raise BlobExpiredError(f"{ref.name} has expired, please upload it again") from None
+        with f:
+            if ref.size == 0:
+                # Zero-length files cannot be mapped
+                yield f
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                yield view
+
+    def __contains__(self, ref):
+        return os.path.exists(self.path(ref.key))
+
+    def _maybe_sweep(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.ttl / 10:
+                return
+            self._last_sweep = now
+        self.sweep(now)
+
+    def sweep(self, now=None):
+        """
+        Delete blobs (and abandoned spool files) idle for longer than the
+        TTL. Returns the number of files removed.
+        """
+        cutoff = (now or time.time()) - self.ttl
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_blob_store():
+    """
+    Return the process-wide blob store, created on first use.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = BlobStore()
+        return _default_store
@@ -0,0 +1,122 @@
+import os
+import re
+import copy
+from typing import Any, Dict, List
+
+DEFAULT_CHUNK_TOKENS = int(os.getenv('EXTRACTION_CHUNK_TOKENS', '6000'))
+DEFAULT_CHUNK_WORKERS = int(os.getenv('EXTRACTION_CHUNK_WORKERS', '4'))
+# Floor for budget-derived chunk sizes, so an oversized prompt truncates
+# instead of splitting a document into thousands of tiny chunks
+MIN_CHUNK_TOKENS = 256
+
+# Pages are joined with a form feed so text can be split back on them
+PAGE_SEPARATOR = "\f"
+_SECTION_BREAK = re.compile(r"\n\s*\n")
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count for `text`. Uses tiktoken when it is installed, otherwise the
+    usual ~4 characters per token approximation.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def _split_oversized(piece: str, max_tokens: int) -> List[str]:
+    """
+    Break a single page that is over budget into sections, then lines, and
+    as a last resort fixed-size character windows.
+    """
+    sections = _SECTION_BREAK.split(piece)
+    if len(sections) > 1:
+        return _pack(sections, max_tokens, "\n\n")
+
+    lines = piece.split("\n")
+    if len(lines) > 1:
+        return _pack(lines, max_tokens, "\n")
+
+    window = max_tokens * 4
+    return [piece[i:i + window] for i in range(0, len(piece), window)]
+
+
+def _pack(parts: List[str], max_tokens: int, joiner: str) -> List[str]:
+    chunks, current, current_tokens = [], [], 0
+    for part in parts:
+        tokens = estimate_tokens(part)
+        if tokens > max_tokens:
+            if current:
+                chunks.append(joiner.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(part, max_tokens))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        chunks.append(joiner.join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """
+    Split document text into chunks of at most `max_tokens`, preferring page
+    boundaries, then section (blank line) boundaries.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    return _pack(text.split(PAGE_SEPARATOR), max_tokens, PAGE_SEPARATOR)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def merge_extractions(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-chunk extraction results in document order.
+
+    - nested objects are merged key by key
+    - lists are concatenated without duplicates
+    - for scalars the first non-empty value wins; any different value seen
+      later is recorded under "_conflicts" keyed by the dotted field path
+    """
+    merged: Dict[str, Any] = {}
+    conflicts: Dict[str, List[Any]] = {}
+
+    def merge_into(target, source, prefix):
+        for key, value in source.items():
+            path = f"{prefix}{key}"
+            if _is_empty(value):
+                target.setdefault(key, copy.deepcopy(value))
+                continue
+            existing = target.get(key)
+            if _is_empty(existing):
+                target[key] = copy.deepcopy(value)
+            elif isinstance(existing, dict) and isinstance(value, dict):
+                merge_into(existing, value, f"{path}.")
+            elif isinstance(existing, list) and isinstance(value, list):
+                existing.extend(item for item in value if item not in existing)
+            elif existing != value:
+                seen = conflicts.setdefault(path, [existing])
+                if value not in seen:
+                    seen.append(value)
+
+    for partial in partials:
+        if isinstance(partial, dict):
+            merge_into(merged, partial, "")
+
+    if conflicts:
+        merged["_conflicts"] = conflicts
+    return merged
@@ -0,0 +1,250 @@
+import os
+import hmac
+import hashlib
+import sqlite3
+import threading
+import queue
+from itertools import islice
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import instrument
+
+# Kept as module constants so every pooled connection hits the same entry
+# in sqlite3's per-connection prepared statement cache.
+USER_BY_SSN_SQL = "SELECT name, email, address FROM users WHERE ssn = ?"
+USER_BY_SSN_HASH_SQL = "SELECT name, email, address FROM users WHERE ssn_hash = ?"
+TAX_RECORDS_BY_SSN_SQL = (
+    "SELECT t.year, t.income, t.deductions, t.tax_paid FROM users u "
+    "JOIN tax_records t ON t.user_id = u.id WHERE u.ssn = ? ORDER BY t.year"
+)
+TAX_RECORDS_BY_SSN_HASH_SQL = (
+    "SELECT t.year, t.income, t.deductions, t.tax_paid FROM users u "
+    "JOIN tax_records t ON t.user_id = u.id WHERE u.ssn_hash = ? ORDER BY t.year"
+)
+
+# Bulk lookups bind one parameter per SSN; stay under SQLite's default
+# SQLITE_MAX_VARIABLE_NUMBER of 999 on older builds
+BULK_LOOKUP_CHUNK_SIZE = 500
+
+# Schema version (PRAGMA user_version) that introduced users.ssn_hash,
+# see migrations.py
+SSN_HASH_SCHEMA_VERSION = 2
+
+# Secret for the keyed SSN hash. Must be set in production; changing it
+# requires re-running the ssn_hash backfill.
+DEFAULT_SSN_HASH_KEY = 'development-only-ssn-hash-key'
+SSN_HASH_KEY = os.getenv('SSN_HASH_KEY', DEFAULT_SSN_HASH_KEY).encode('utf-8')
+
+
+def hash_ssn(ssn):
+    """
+    Keyed HMAC-SHA256 of the SSN digits, used as the lookup key so queries
+    never match on the plaintext column.
+    """
+    digits = ''.join(c for c in str(ssn) if c.isdigit())
+    return hmac.new(SSN_HASH_KEY, digits.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=8, read_only=True, cached_statements=128, timeout=5.0):
+        """
+        Thread-safe pool of long-lived SQLite connections.
+
+        Connections are opened lazily up to `size` and handed out through
+        `connection()`. Read-only pools open the database with `mode=ro`
+        so lookups can never take a write lock.
+        """
+        self.db_path = db_path
+        self.size = size
+        self.read_only = read_only
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all = []
+        self._wal_checked = False
+        self._closed = False
+        self._schema_version = None
+
+    def _ensure_wal(self):
+        """
+        Switch the database to WAL journaling once per pool. WAL mode is
+        persistent, so this only needs a short-lived writable connection.
+        """
+        if self._wal_checked:
+            return
+        self._wal_checked = True
+        if not Path(self.db_path).exists():
+            return
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Unable to enable WAL journaling: {e}")
+
+    def _connect(self):
+        if self.read_only:
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                timeout=self.timeout,
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+            )
+            conn.execute("PRAGMA query_only=1")
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.timeout,
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+            )
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of the `with` block.
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        with self._lock:
+            self._ensure_wal()
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                with self._lock:
+                    self._all.append(conn)
+
+            yield conn
+
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            # Don't hand a connection in an unknown state to the next caller
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def schema_version(self, conn):
+        """
+        PRAGMA user_version of the database, read once per pool.
+        """
+        if self._schema_version is None:
+            self._schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        return self._schema_version
+
+    def _discard(self, conn):
+        with self._lock:
+            if conn in self._all:
+                self._all.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """
+        Close every connection owned by the pool.
+        """
+        self._closed = True
+        with self._lock:
+            connections, self._all = self._all, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **kwargs):
+    """
+    Return the process-wide pool for `db_path`, creating it on first use.
+    """
+    key = (str(Path(db_path).resolve()), kwargs.get('read_only', True))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def find_user(pool, ssn):
+    """
+    Look up (name, email, address) for an SSN, through the hashed-SSN
+    covering index when the schema has it.
+    """
+    with pool.connection() as conn:
+        if pool.schema_version(conn) >= SSN_HASH_SCHEMA_VERSION:
+            return conn.execute(USER_BY_SSN_HASH_SQL, (hash_ssn(ssn),)).fetchone()
+        return conn.execute(USER_BY_SSN_SQL, (ssn,)).fetchone()
+
+
+def users_bulk_sql(column, chunk_size=BULK_LOOKUP_CHUNK_SIZE):
+    """
+    The find_users_bulk query for one chunk of keys on `column`.
+    """
+    return f"SELECT {column}, name, email, address FROM users WHERE {column} IN ({','.join('?' * chunk_size)})"
+
+
+def find_users_bulk(pool, ssns, chunk_size=BULK_LOOKUP_CHUNK_SIZE):
+    """
+    Resolve an iterable of SSNs over a single pooled connection with chunked
+    IN queries. Yields (ssn, (name, email, address) or None) in input
+    order, so memory stays bounded by one chunk however long the input is.
+    """
+    ssns = iter(ssns)
+    with pool.connection() as conn:
+        hashed = pool.schema_version(conn) >= SSN_HASH_SCHEMA_VERSION
+        # Every chunk is padded to the same size so they all share one
+        # cached prepared statement
+        sql = users_bulk_sql("ssn_hash" if hashed else "ssn", chunk_size)
+
+        while True:
+            chunk = list(islice(ssns, chunk_size))
+            if not chunk:
+                return
+            keys = [hash_ssn(ssn) for ssn in chunk] if hashed else list(chunk)
+            params = keys + [keys[0]] * (chunk_size - len(keys))
+            # Timed per chunk, since the caller consumes results in between
+            with instrument('db', 'find_users_bulk'):
+                found = {row[0]: row[1:] for row in conn.execute(sql, params)}
+            for ssn, key in zip(chunk, keys):
+                yield ssn, found.get(key)
+
+
+def find_tax_records(pool, ssn):
+    """
+    Return [(year, income, deductions, tax_paid), ...] for an SSN, oldest
+    year first.
+    """
+    with pool.connection() as conn:
+        if pool.schema_version(conn) >= SSN_HASH_SCHEMA_VERSION:
+            return conn.execute(TAX_RECORDS_BY_SSN_HASH_SQL, (hash_ssn(ssn),)).fetchall()
+        return conn.execute(TAX_RECORDS_BY_SSN_SQL, (ssn,)).fetchall()
@@ -0,0 +1,166 @@
+import os
+import json
+import hashlib
+import threading
+import tempfile
+
+DEFAULT_CACHE_DIR = os.getenv('DOCUMENT_CACHE_DIR', '.document_cache')
+DEFAULT_MAX_BYTES = int(os.getenv('DOCUMENT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def content_digest(file_content) -> str:
+    """
+    SHA-256 of file bytes or a seekable stream. Streams are hashed in chunks
+    and rewound to where they were.
+    """
+    if isinstance(file_content, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(file_content).hexdigest()
+
+    digest = hashlib.sha256()
+    position = file_content.tell()
+    file_content.seek(0)
+    for chunk in iter(lambda: file_content.read(_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file_content.seek(position)
+    return digest.hexdigest()
+
+
+def context_digest(known_info) -> str:
+    """
+    Short stable hash of the user details an extraction prompt includes, so
+    one user's extraction is never served to another.
+    """
+    encoded = json.dumps(known_info or {}, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class DocumentCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Content-addressed on-disk cache for uploaded documents.
+
+        Raw OCR/PDF text is stored once per file digest under `text/`, and
+        structured extraction results per (digest, form_type) under
+        `extract/`, so a re-upload for a different form reuses the text.
+        Extractions are also keyed on a hash of the known user details sent
+        with the prompt. Least recently used files are evicted once the
+        cache exceeds `max_bytes`.
+
+        Entries are plaintext and hold the contents of tax documents (W-2
+        OCR text, extracted SSNs and amounts). The directory is created
+        owner-only (0700) and files are written 0600; keep `root` on a
+        private, ideally encrypted, volume.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        # makedirs leaves an existing directory's mode alone
+        os.chmod(root, 0o700)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _text_path(self, digest):
+        return os.path.join(self.root, 'text', digest[:2], f"{digest}.txt")
+
+    def _extraction_path(self, digest, form_type, known_info=None):
+        safe_form_type = "".join(c if c.isalnum() or c in '-_' else '_' for c in form_type)
+        return os.path.join(
+            self.root, 'extract', safe_form_type, digest[:2], f"{digest}-{context_digest(known_info)}.json"
+        )
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = f.read()
+        except OSError:
+            return None
+        # Bump mtime so eviction is least-recently-used rather than oldest
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        encoded = data.encode('utf-8')
+        # mkstemp creates the file 0600
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Document cache write failed: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._size += len(encoded)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        # Trim to 90% so we don't evict again on the very next write
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def get_text(self, digest):
+        return self._read(self._text_path(digest))
+
+    def set_text(self, digest, text):
+        self._write(self._text_path(digest), text)
+
+    def get_extraction(self, digest, form_type, known_info=None):
+        data = self._read(self._extraction_path(digest, form_type, known_info))
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            return None
+
+    def set_extraction(self, digest, form_type, extracted_info, known_info=None):
+        self._write(self._extraction_path(digest, form_type, known_info), json.dumps(extracted_info))
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_document_cache():
+    """
+    Return the process-wide document cache, created on first use.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = DocumentCache()
+        return _default_cache
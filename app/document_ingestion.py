@@ -0,0 +1,305 @@
+import io
+import os
+import mmap
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytesseract
+import PyPDF2
+from PIL import Image
+
+from document_cache import DocumentCache, content_digest
+from chunking import PAGE_SEPARATOR
+from metrics import instrument, record_cache
+
+SUPPORTED_EXTENSIONS = ('pdf', 'jpg', 'jpeg', 'png', 'tiff')
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'tiff')
+
+DEFAULT_OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(os.cpu_count() or 2)))
+DEFAULT_EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '8'))
+
+MAX_PDF_PAGES = int(os.getenv('MAX_PDF_PAGES', '500'))
+MAX_DOCUMENT_BYTES = int(os.getenv('MAX_DOCUMENT_BYTES', str(50 * 1024 * 1024)))
+# Scanned pages rasterized per pdf2image call; each page is tens of MB at 200 DPI
+PDF_OCR_BATCH_PAGES = int(os.getenv('PDF_OCR_BATCH_PAGES', '8'))
+
+
+try:
+    from pdf2image import convert_from_bytes
+except ImportError:
+    convert_from_bytes = None
+
+
+class DocumentTooLargeError(ValueError):
+    pass
+
+
+def file_extension(file_name: str) -> str:
+    return file_name.split('.')[-1].lower()
+
+
+def _as_stream(file_content):
+    if isinstance(file_content, (bytes, bytearray, memoryview)):
+        return io.BytesIO(file_content)
+    return file_content
+
+
+def check_document_size(stream, max_bytes: int = MAX_DOCUMENT_BYTES) -> int:
+    """
+    Return the size of a seekable stream, raising DocumentTooLargeError when
+    it exceeds `max_bytes`. The stream position is restored.
+    """
+    position = stream.tell()
+    # mmap.seek() returns None before Python 3.13, so ask tell()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    if max_bytes and size > max_bytes:
+        raise DocumentTooLargeError(f"Document is {size} bytes, limit is {max_bytes}")
+    return size
+
+
+def ocr_pdf_pages(pdf_bytes: bytes, first_index: int, last_index: int):
+    """
+    Lazily OCR a run of PDF pages, rasterizing at most PDF_OCR_BATCH_PAGES
+    per pdf2image call and releasing each batch before converting the next.
+    Without pdf2image (and poppler) the pages are left empty, with a
+    warning.
+    """
+    count = last_index - first_index + 1
+    if convert_from_bytes is None:
+        print(f"OCR unavailable, {count} scanned PDF page(s) left empty: install pdf2image and poppler")
+        yield from [""] * count
+        return
+    batch_pages = max(PDF_OCR_BATCH_PAGES, 1)
+    for start in range(first_index, last_index + 1, batch_pages):
+        end = min(start + batch_pages, last_index + 1)
+        images = convert_from_bytes(pdf_bytes, first_page=start + 1, last_page=end)
+        try:
+            texts = [pytesseract.image_to_string(image) for image in images]
+        finally:
+            for image in images:
+                image.close()
+            del images
+        yield from texts
+
+
+def iter_pdf_pages(stream, max_pages: int = MAX_PDF_PAGES, ocr_empty_pages: bool = True):
+    """
+    Lazily yield the text of each page in a PDF stream. Pages without a text
+    layer (scanned pages) are rasterized and OCR'd, each consecutive run of
+    them in batches of PDF_OCR_BATCH_PAGES.
+    """
+    pdf_reader = PyPDF2.PdfReader(stream)
+    page_count = len(pdf_reader.pages)
+    if max_pages and page_count > max_pages:
+        raise DocumentTooLargeError(f"Document has {page_count} pages, limit is {max_pages}")
+
+    pdf_bytes = None
+    scanned = []
+    for index, page in enumerate(pdf_reader.pages):
+        text = page.extract_text() or ""
+        if ocr_empty_pages and not text.strip():
+            scanned.append(index)
+            continue
+        if scanned:
+            pdf_bytes = pdf_bytes if pdf_bytes is not None else _read_all(stream)
+            yield from ocr_pdf_pages(pdf_bytes, scanned[0], scanned[-1])
+            scanned = []
+        yield text
+    if scanned:
+        pdf_bytes = pdf_bytes if pdf_bytes is not None else _read_all(stream)
+        yield from ocr_pdf_pages(pdf_bytes, scanned[0], scanned[-1])
+
+
+def _read_all(stream) -> bytes:
+    # Only buffer the raw file once a page actually needs rasterizing
+    stream.seek(0)
+    return stream.read()
+
+
+def extract_pdf_text(file_content, max_pages: int = MAX_PDF_PAGES, max_bytes: int = MAX_DOCUMENT_BYTES,
+                     ocr_empty_pages: bool = True) -> str:
+    """
+    Extract text from PDF bytes or a seekable stream, one page at a time.
+    """
+    stream = _as_stream(file_content)
+    check_document_size(stream, max_bytes)
+    pages = list(iter_pdf_pages(stream, max_pages, ocr_empty_pages))
+    return PAGE_SEPARATOR.join(pages)
+
+
+def extract_text(file_extension: str, file_content) -> str:
+    """
+    Pull raw text out of a PDF or scanned image, given bytes or a seekable
+    stream. Module-level so it can be shipped to OCR worker processes.
+    """
+    # PDF Processing
+    if file_extension == 'pdf':
+        return extract_pdf_text(file_content)
+
+    # Image Processing (for scanned documents)
+    stream = _as_stream(file_content)
+    check_document_size(stream)
+    # pytesseract takes images or paths, not streams
+    with Image.open(stream) as image:
+        return pytesseract.image_to_string(image)
+
+
+def extract_file_text(file_extension: str, path: str) -> str:
+    """
+    extract_text() for a file on disk, memory-mapped rather than read. OCR
+    workers are sent the path instead of the pickled file bytes.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return extract_text(file_extension, f)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return extract_text(file_extension, view)
+
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for CPU-bound OCR, created on first use.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=DEFAULT_OCR_WORKERS)
+        return _ocr_pool
+
+
+def reset_ocr_pool(broken: ProcessPoolExecutor) -> None:
+    """
+    Drop a broken OCR pool (a worker died, or returned an exception that
+    could not be unpickled) so the next get_ocr_pool() builds a fresh one.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is broken:
+            _ocr_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_ocr(fn: Callable, *args):
+    """
+    Submit an OCR job to the shared pool, rebuilding the pool once if it
+    turns out to be broken. Returns the pool used and the future.
+    """
+    ocr_pool = get_ocr_pool()
+    try:
+        return ocr_pool, ocr_pool.submit(fn, *args)
+    except BrokenProcessPool:
+        reset_ocr_pool(ocr_pool)
+        ocr_pool = get_ocr_pool()
+        return ocr_pool, ocr_pool.submit(fn, *args)
+
+
+def ingest_parallel(
+    uploads: List[Tuple[str, Any]],
+    extract_structured: Callable[[str, str], Dict[str, Any]],
+    max_workers: int = DEFAULT_EXTRACTION_WORKERS,
+    cache: DocumentCache = None,
+    form_type: str = "",
+    digests: List[str] = None,
+    paths: List[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Extract every upload concurrently and return one result per file, in
+    upload order.
+
+    Images are OCR'd in the shared process pool; PDF text extraction and the
+    network-bound `extract_structured(text, digest)` calls run in a thread
+    pool. Files with identical bytes are processed once, and text already in
+    `cache` skips OCR entirely. A failure is recorded against its own file
+    and never discards the others. `form_type` only labels metrics.
+
+    Contents may be bytes or seekable streams such as blob store memory
+    maps. `digests`, when known, saves re-hashing them; `paths` (None per
+    file that is not on disk) lets OCR workers map the file themselves.
+    """
+    if not uploads:
+        return []
+
+    if digests is None:
+        digests = [content_digest(file_content) for _, file_content in uploads]
+    first_index = {}
+    for index, digest in enumerate(digests):
+        first_index.setdefault(digest, index)
+    unique = sorted(first_index.values())
+
+    cached_text = {}
+    if cache is not None:
+        for index in unique:
+            text = cache.get_text(digests[index])
+            record_cache('document_text', 'process_document_upload', form_type, text is not None)
+            if text is not None:
+                cached_text[index] = text
+
+    ocr_futures = {}
+    submit_errors = {}
+    for index in unique:
+        file_name, file_content = uploads[index]
+        if index not in cached_text and file_extension(file_name) in IMAGE_EXTENSIONS:
+            try:
+                if paths and paths[index]:
+                    ocr_futures[index] = submit_ocr(extract_file_text, file_extension(file_name), paths[index])
+                else:
+                    ocr_futures[index] = submit_ocr(extract_text, file_extension(file_name), file_content)
+            except Exception as e:
+                # Reported against this file by ingest_one
+                submit_errors[index] = e
+
+    def ingest_one(index):
+        file_name, file_content = uploads[index]
+        extension = file_extension(file_name)
+        try:
+            if extension not in SUPPORTED_EXTENSIONS:
+                raise ValueError(f"Unsupported file type: {extension}")
+            if index in submit_errors:
+                raise submit_errors[index]
+            if index in cached_text:
+                text = cached_text[index]
+            else:
+                # For pooled OCR this is the wait for the worker's result
+                with instrument('ocr', 'process_document_upload', form_type):
+                    if index in ocr_futures:
+                        ocr_pool, future = ocr_futures[index]
+                        try:
+                            text = future.result()
+                        except BrokenProcessPool:
+                            reset_ocr_pool(ocr_pool)
+                            raise
+                    else:
+                        text = extract_text(extension, file_content)
+                if cache is not None:
+                    cache.set_text(digests[index], text)
+            return {
+                "file_name": file_name,
+                "status": "success",
+                "extracted_info": extract_structured(text, digests[index])
+            }
+        except Exception as e:
+            return {
+                "file_name": file_name,
+                "status": "error",
+                "message": f"Error processing {file_name}: {str(e)}"
+            }
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as executor:
+        unique_results = dict(zip(unique, executor.map(ingest_one, unique)))
+
+    results = []
+    for index, (file_name, _) in enumerate(uploads):
+        source = first_index[digests[index]]
+        if source == index:
+            results.append(unique_results[index])
+        else:
+            results.append(dict(unique_results[source], file_name=file_name, duplicate_of=uploads[source][0]))
+    return results
@@ -1,291 +1,111 @@
-import os
-import io
-import sqlite3
 import json
-import pytesseract
-import PyPDF2
-from dotenv import load_dotenv
-from openai import OpenAI  
-from typing import Dict, List, Any, Union
+from typing import Dict, List, Any
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 
-load_dotenv()
+from assistant_base import BaseFormAssistantService
+from metrics import instrument, record_cache
+from prompts import EXTRACTION_PROMPT
+from document_ingestion import SUPPORTED_EXTENSIONS, extract_text, ingest_parallel
+from document_cache import get_document_cache, content_digest
+from blob_store import BlobRef, BlobExpiredError, get_blob_store
+from form_schema import get_form_registry
+from chunking import chunk_text, merge_extractions, DEFAULT_CHUNK_TOKENS, DEFAULT_CHUNK_WORKERS, MIN_CHUNK_TOKENS
 
-class FormAssistantService:
-    def __init__(self, api_key=None):
+class FormAssistantService(BaseFormAssistantService):
+    def __init__(self, api_key=None, base_url=None):
         """
-        Initialize Grok client with X.AI endpoint
+        The full service: the shared LLM calls plus form schemas and
+        document processing
         """
-        try:
-            self.client = OpenAI(
-                api_key=os.getenv('XAI_API_KEY'),
-                base_url="https://api.x.ai/v1"  # Assuming this is the correct Grok API URL
-            )
-        except Exception as e:
-            print(f"Failed to initialize client: {e}")
-            self.client = None
-        
-        self.db_path = 'tax_data.db'
+        super().__init__(api_key, base_url)
 
-    def retrieve_user_info(self, ssn):
-        """
-        Retrieve user information from the database.
-        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT name, email, address
-                FROM users 
-                WHERE ssn = ?
-            ''', (ssn,))
-            
-            result = cursor.fetchone()
-            
-            if result:
-                return {
-                    'name': result[0],
-                    'email': result[1],
-                    'address': result[2]
-                }
-            else:
-                return {"message": "User not registered. Please register your details first."}
-        
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return {"error": "Database error occurred. Please try again later."}
-        finally:
-            conn.close()
+            self.document_cache = get_document_cache()
+        except OSError as e:
+            print(f"Failed to open document cache: {e}")
+            self.document_cache = None
 
-    def analyze_form_requirements(self, user_info, form_type):
-        """
-        Analyze form requirements with mock data if no AI client
-        """
-        if not self.client:
-            return {
-                "analysis": f"Mock analysis for {form_type} form. Requires additional documents: Birth Certificate, Proof of Income"
-            }
-
-        # Rest of the method remains the same as in the original implementation
-        prompt = f"""
-        You are an expert government form assistant. 
-        
-        User Information:
-        {json.dumps(user_info)}
-        
-        Form Type: {form_type}
-        
-        Analyze the user's current information and the requirements for the {form_type} form.
-        Provide a comprehensive response with:
-        1. List of missing required fields
-        2. Suggested documents that could help fill those fields
-        3. Specific guidance on obtaining missing information
-        4. Potential red flags or additional verification needs
-        """
-        
         try:
-            response = self.client.chat.completions.create(
-                model="grok-beta",
-                messages=[
-                    {"role": "system", "content": "You are a helpful government form assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            return {
-                "analysis": response.choices[0].message.content
-            }
-        
-        except Exception as e:
-            print(f"Error in AI analysis: {e}")
-            return {
-                "error": "Unable to process form requirements automatically."
-            }
-
-    def ask_form_guidance(self, form_type, user_question):
-        """
-        Provide mock guidance if no AI client
-        """
-        if not self.client:
-            return {
-                "guidance": f"Mock guidance for {form_type}. Please consult official documentation for specific details."
-            }
-
-        # Rest of the method remains the same as in the original implementation
-        try:
-            prompt = f"""
-            You are an expert government form and agency information assistant.
-
-            Form Type: {form_type}
-
-            User Question: {user_question}
-
-            Please provide a comprehensive response that:
-            1. Directly answers the user's specific question
-            2. Provides context about why this information is collected
-            3. Explains the legal basis for collecting this information
-            4. Offers guidance on how to accurately complete the relevant sections
-            5. Highlight any privacy protections or data usage policies
-            """
-            
-            response = self.client.chat.completions.create(
-                model="grok-beta",
-                messages=[
-                    {"role": "system", "content": "You are a helpful government form guidance assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            return {
-                "guidance": response.choices[0].message.content
-            }
-        
-        except Exception as e:
-            print(f"Error in form guidance generation: {e}")
-            return {
-                "error": "Unable to generate form guidance automatically."
-            }
+            self.blob_store = get_blob_store()
+        except OSError as e:
+            print(f"Failed to open blob store: {e}")
+            self.blob_store = None
 
-    def determine_review_necessity(self, form_data):
-        """
-        Provide mock review necessity if no AI client
-        """
-        if not self.client:
-            return {
-                "review_analysis": "Based on the submitted information, this form may require manual review. Please be prepared to provide additional documentation if requested."
-            }
-
-        try:
-            response = self.client.chat.completions.create(
-                model="grok-beta",
-                messages=[
-                    {"role": "system", "content": "You are a fraud detection assistant."},
-                    {"role": "user", "content": f"Analyze these form details for review necessity: {json.dumps(form_data)}"}
-                ]
-            )
-            
-            return {
-                "review_analysis": response.choices[0].message.content
-            }
-        
-        except Exception as e:
-            print(f"Error in review determination: {e}")
-            return {
-                "error": "Unable to automatically assess form"
-            }
-        
+        self.chunk_token_budget = DEFAULT_CHUNK_TOKENS
+        self.form_registry = get_form_registry()
 
     def generate_form_fields(self, form_type: str, user_info: Dict[str, str]) -> Dict[str, List[Dict[str, Any]]]:
         """
         Generate dynamic form fields with document upload requirements
         """
-        form_fields = {
-            "tax-return": [
-                {"label": "Full Name", "type": "text", "value": user_info.get('name', ''), "required": True},
-                {"label": "Email", "type": "email", "value": user_info.get('email', ''), "required": True},
-                {"label": "Address", "type": "text", "value": user_info.get('address', ''), "required": True},
-                {"label": "Social Security Number", "type": "text", "value": user_info.get('ssn', ''), "required": True},
-                {"label": "Income", "type": "number", "value": "", "required": True},
-                {"label": "W-2 Form", "type": "file", "value": None, "required": True, 
-                 "description": "Upload your W-2 form for income verification"},
-                {"label": "1099 Forms", "type": "file", "value": None, "required": False, 
-                 "description": "Upload additional income forms if applicable"},
-                {"label": "Previous Year Tax Return", "type": "file", "value": None, "required": False, 
-                 "description": "Upload previous year's tax return for reference"}
-            ],
-            "immigration-visa": [
-                {"label": "Full Name", "type": "text", "value": user_info.get('name', ''), "required": True},
-                {"label": "Email", "type": "email", "value": user_info.get('email', ''), "required": True},
-                {"label": "Address", "type": "text", "value": user_info.get('address', ''), "required": True},
-                {"label": "Passport Number", "type": "text", "value": "", "required": True},
-                {"label": "Passport Copy", "type": "file", "value": None, "required": True, 
-                 "description": "Upload a clear copy of your passport"},
-                {"label": "Birth Certificate", "type": "file", "value": None, "required": True, 
-                 "description": "Upload your birth certificate"},
-                {"label": "Visa Type", "type": "select", "options": ["Tourist", "Work", "Student", "Permanent Resident"], "value": "", "required": True},
-                {"label": "Proof of Employment/Education", "type": "file", "value": None, "required": True, 
-                 "description": "Upload employment letter or educational documents"}
-            ],
-            "social-security-benefits": [
-                {"label": "Full Name", "type": "text", "value": user_info.get('name', ''), "required": True},
-                {"label": "Email", "type": "email", "value": user_info.get('email', ''), "required": True},
-                {"label": "Address", "type": "text", "value": user_info.get('address', ''), "required": True},
-                {"label": "Date of Birth", "type": "date", "value": "", "required": True},
-                {"label": "Birth Certificate", "type": "file", "value": None, "required": True, 
-                 "description": "Upload your birth certificate"},
-                {"label": "Previous Pay Stubs", "type": "file", "value": None, "required": False, 
-                 "description": "Upload recent pay stubs for income verification"},
-                {"label": "Benefit Type", "type": "select", "options": ["Retirement", "Disability", "Survivors"], "value": "", "required": True}
-            ],
-            # Similar comprehensive field additions for other form types...
-        }
-        
-        return {"fields": form_fields.get(form_type, [])}
+        schema = self.form_registry.get(form_type)
+        return {"fields": schema.generate(user_info) if schema else []}
 
-    def process_document_upload(self,userInfo, uploaded_files: List[Any], form_type: str) -> Dict[str, Any]:
+    def process_document_upload(self,userInfo, uploaded_files: List[Any], form_type: str,
+                                parallel: bool = False, max_workers: int = None) -> Dict[str, Any]:
         """
         Comprehensive document processing using AI and OCR
+
+        With parallel=True, files are OCR'd and extracted concurrently and
+        failures are reported per file in "files" instead of aborting.
         """
+        # Only a missing client rules this out: while the circuit is open,
+        # files already extracted are still served from the document cache
         if not self.client:
             return {
                 "status": "error",
                 "message": "AI client not available for document processing"
             }
         
+        if parallel:
+            return self._process_documents_parallel(userInfo, uploaded_files, form_type, max_workers)
+        
         extracted_info = {}
+        seen_digests = set()
         
-        for uploaded_file in uploaded_files:
-            # Read file content
-            file_content = uploaded_file.read()
-            file_name = uploaded_file.name
-            file_extension = file_name.split('.')[-1].lower()
-            
-            try:
-                # PDF Processing
-                if file_extension == 'pdf':
-                    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text()
-                
-                # Image Processing (for scanned documents)
-                elif file_extension in ['jpg', 'jpeg', 'png', 'tiff']:
-                    text = pytesseract.image_to_string(io.BytesIO(file_content))
+        with ExitStack() as stack:
+            for uploaded_file in uploaded_files:
+                file_name = uploaded_file.name
+                file_extension = file_name.split('.')[-1].lower()
                 
-                else:
+                if file_extension not in SUPPORTED_EXTENSIONS:
                     return {
                         "status": "error",
                         "message": f"Unsupported file type: {file_extension}"
                     }
                 
-                # Use AI to extract structured information
-                extraction_prompt = f"""
-                Extract structured information from this document for a {form_type} form excluding {userInfo}.
-                
-                Document Text:
-                {text}
-                
-                Please provide a JSON response with extracted key-value pairs relevant to the form type.
-                """
-                
-                response = self.client.chat.completions.create(
-                    model="grok-beta",
-                    messages=[
-                        {"role": "system", "content": "You are an expert document information extractor."},
-                        {"role": "user", "content": extraction_prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                
-                # Parse extracted information
-                parsed_info = json.loads(response.choices[0].message.content)
-                extracted_info.update(parsed_info)
-                
-            except Exception as e:
-                return {
-                    "status": "error",
-                    "message": f"Error processing {file_name}: {str(e)}"
-                }
+                try:
+                    if isinstance(uploaded_file, BlobRef):
+                        # Memory-mapped from the blob store, already hashed
+                        file_content = stack.enter_context(self.blob_store.open(uploaded_file))
+                        digest = uploaded_file.key
+                    else:
+                        # PDFs are parsed page by page straight from the upload stream
+                        file_content = uploaded_file if file_extension == 'pdf' else uploaded_file.read()
+                        digest = content_digest(file_content)
+                    
+                    # The same file uploaded twice in one batch adds nothing new
+                    if digest in seen_digests:
+                        continue
+                    seen_digests.add(digest)
+                    
+                    text = self._extract_text(file_extension, file_content, digest, form_type)
+                    
+                    # Use AI to extract structured information
+                    parsed_info = self._extract_structured(userInfo, text, form_type, digest)
+                    extracted_info.update(parsed_info)
+                    
+                except BlobExpiredError as e:
+                    return {
+                        "status": "error",
+                        "message": str(e)
+                    }
+                except Exception as e:
+                    return {
+                        "status": "error",
+                        "message": f"Error processing {file_name}: {str(e)}"
+                    }
         
         return {
             "status": "success",
@@ -293,6 +113,127 @@ class FormAssistantService:
             "extracted_info": extracted_info
         }
 
+    def _process_documents_parallel(self, userInfo, uploaded_files, form_type, max_workers=None):
+        kwargs = {"max_workers": max_workers} if max_workers else {}
+        uploads, digests, paths = [], [], []
+        # Upload index -> result for blobs swept before they could be opened
+        expired = {}
+        with ExitStack() as stack:
+            for index, uploaded_file in enumerate(uploaded_files):
+                if isinstance(uploaded_file, BlobRef):
+                    try:
+                        # Zero-copy views; OCR workers map the blob file themselves
+                        view = stack.enter_context(self.blob_store.open(uploaded_file))
+                    except BlobExpiredError as e:
+                        expired[index] = {"file_name": uploaded_file.name, "status": "error", "message": str(e)}
+                        continue
+                    uploads.append((uploaded_file.name, view))
+                    digests.append(uploaded_file.key)
+                    paths.append(self.blob_store.path(uploaded_file.key))
+                else:
+                    content = uploaded_file.read()
+                    uploads.append((uploaded_file.name, content))
+                    digests.append(content_digest(content))
+                    paths.append(None)
+            
+            files = ingest_parallel(
+                uploads,
+                lambda text, digest: self._extract_structured(userInfo, text, form_type, digest),
+                cache=self.document_cache,
+                form_type=form_type,
+                digests=digests,
+                paths=paths,
+                **kwargs
+            )
+        
+        if expired:
+            ingested = iter(files)
+            files = [expired[index] if index in expired else next(ingested) for index in range(len(uploaded_files))]
+        
+        # Merge in upload order so later files win, as in the sequential path
+        extracted_info = {}
+        failed = []
+        for result in files:
+            if result["status"] == "success":
+                extracted_info.update(result["extracted_info"])
+            else:
+                failed.append(result["file_name"])
+        
+        if not failed:
+            status, message = "success", "Documents processed successfully"
+        elif len(failed) < len(files):
+            status, message = "partial", f"Some documents could not be processed: {', '.join(failed)}"
+        else:
+            status, message = "error", "None of the documents could be processed"
+        
+        return {
+            "status": status,
+            "message": message,
+            "extracted_info": extracted_info,
+            "files": files
+        }
+
+    def _extract_text(self, file_extension: str, file_content, digest: str = None, form_type: str = "") -> str:
+        """
+        Pull raw text out of a PDF or scanned image, reusing cached text for
+        files we have already seen
+        """
+        if digest and self.document_cache:
+            text = self.document_cache.get_text(digest)
+            record_cache('document_text', 'process_document_upload', form_type, text is not None)
+            if text is not None:
+                return text
+        
+        with instrument('ocr', 'process_document_upload', form_type):
+            text = extract_text(file_extension, file_content)
+        if digest and self.document_cache:
+            self.document_cache.set_text(digest, text)
+        return text
+
+    def _extract_structured(self, userInfo, text, form_type, digest: str = None) -> Dict[str, Any]:
+        if digest and self.document_cache:
+            cached = self.document_cache.get_extraction(digest, form_type, userInfo)
+            record_cache('document_extraction', 'process_document_upload', form_type, cached is not None)
+            if cached is not None:
+                return cached
+        
+        # Long documents are split to fit the token budget and the chunks are
+        # extracted concurrently, then merged back in document order
+        chunks = chunk_text(text, self._chunk_tokens(userInfo, form_type))
+        if len(chunks) == 1:
+            parsed_info = self._extract_chunk(userInfo, chunks[0], form_type)
+        else:
+            with ThreadPoolExecutor(max_workers=min(DEFAULT_CHUNK_WORKERS, len(chunks))) as executor:
+                partials = list(executor.map(
+                    lambda chunk: self._extract_chunk(userInfo, chunk, form_type), chunks
+                ))
+            parsed_info = merge_extractions(partials)
+        
+        if digest and self.document_cache:
+            self.document_cache.set_extraction(digest, form_type, parsed_info, userInfo)
+        return parsed_info
+
+    def _extract_chunk(self, userInfo, text, form_type) -> Dict[str, Any]:
+        response = self._chat(
+            'process_document_upload', form_type,
+            self._extraction_messages(userInfo, text, form_type),
+            response_format={"type": "json_object"}
+        )
+        
+        # Parse extracted information
+        return json.loads(response.choices[0].message.content)
+
+    def _chunk_tokens(self, userInfo, form_type):
+        """
+        Chunk size that fits the extraction prompt's budget alongside
+        userInfo, so chunks are never truncated; at most chunk_token_budget
+        """
+        room = EXTRACTION_PROMPT.room_for('text', form_type, known_info=userInfo)
+        return max(MIN_CHUNK_TOKENS, min(self.chunk_token_budget, room))
+
+    def _extraction_messages(self, userInfo, text, form_type):
+        return EXTRACTION_PROMPT.render(form_type, known_info=userInfo, text=text)
+
     def validate_form_fields(self, form_fields: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Enhanced validation to check document uploads and field requirements
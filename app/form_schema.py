@@ -0,0 +1,115 @@
+"""
+Registry of agency form definitions, loaded once from form_schemas.json.
+
+Each form type is compiled into immutable field descriptors with the
+per-field output dict prebuilt, plus index tuples for required, file and
+prefilled fields. Generating a user's form then only copies those template
+dicts and fills in the values that depend on the user.
+"""
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SCHEMA_PATH = os.getenv(
+    'FORM_SCHEMAS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'form_schemas.json')
+)
+
+FIELD_TYPES = frozenset(('text', 'email', 'date', 'number', 'select', 'file'))
+
+
+class FieldDescriptor:
+    __slots__ = ('label', 'type', 'required', 'description', 'options', 'prefill', 'template')
+
+    def __init__(self, label, type, required=False, description=None, options=None, prefill=None):
+        """
+        One immutable form field. `prefill` names the user_info key the
+        value is copied from; `template` is the output dict every user
+        starts from.
+        """
+        if type not in FIELD_TYPES:
+            raise ValueError(f"Unknown field type {type!r} for {label!r}")
+        if type == 'select' and not options:
+            raise ValueError(f"Select field {label!r} needs options")
+
+        template = {"label": label, "type": type, "value": None if type == 'file' else "", "required": required}
+        if options:
+            template["options"] = tuple(options)
+        if description:
+            template["description"] = description
+
+        for name, value in (('label', label), ('type', type), ('required', required), ('description', description),
+                            ('options', tuple(options) if options else None), ('prefill', prefill),
+                            ('template', template)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"FieldDescriptor({self.label!r}, {self.type!r}, required={self.required})"
+
+
+class FormSchema:
+    __slots__ = ('form_type', 'title', 'fields', 'required_indexes', 'prefill_indexes')
+
+    def __init__(self, form_type, title, fields):
+        self.form_type = form_type
+        self.title = title
+        self.fields = tuple(fields)
+        self.required_indexes = tuple(i for i, field in enumerate(self.fields) if field.required)
+        self.prefill_indexes = tuple(i for i, field in enumerate(self.fields) if field.prefill)
+
+    def generate(self, user_info: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Field dicts for one user, in the generate_form_fields format.
+        """
+        generated = [dict(field.template) for field in self.fields]
+        for index in self.prefill_indexes:
+            generated[index]["value"] = user_info.get(self.fields[index].prefill, '')
+        return generated
+
+
+class FormSchemaRegistry:
+    def __init__(self, definitions: Dict[str, Dict[str, Any]]):
+        """
+        Compile raw definitions ({form_type: {"title", "fields"}}) into
+        FormSchema objects. Invalid definitions fail here, at startup.
+        """
+        self._schemas = {
+            form_type: FormSchema(
+                form_type,
+                definition.get('title', form_type),
+                [FieldDescriptor(**field) for field in definition['fields']],
+            )
+            for form_type, definition in definitions.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_SCHEMA_PATH) -> 'FormSchemaRegistry':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def get(self, form_type: str) -> Optional[FormSchema]:
+        return self._schemas.get(form_type)
+
+    def form_types(self) -> List[str]:
+        return list(self._schemas)
+
+    def __contains__(self, form_type):
+        return form_type in self._schemas
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_form_registry() -> FormSchemaRegistry:
+    """
+    Return the process-wide registry, loading the definitions on first use.
+    """
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = FormSchemaRegistry.load()
+        return _default_registry
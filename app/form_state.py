@@ -0,0 +1,133 @@
+"""
+Incremental state for filling in a form one field at a time.
+
+A FormState holds only the values, one slot per schema field, and a cursor
+into the schema's precomputed required-field index. Finding the next missing
+field is amortized O(1), and setting a value validates that one field. Both
+costs stay flat however large the form grows. Uploads are stored as small
+BlobRef handles into the blob store, never as file objects, so the state
+stays compact and serializable: the Streamlit UI keeps only to_dict() in
+session state and rebuilds the state on each rerun.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+from blob_store import BlobRef
+from form_schema import FormSchema, FormSchemaRegistry
+
+
+def validate_value(field, raw) -> Tuple[Any, Optional[str]]:
+    """
+    Check one input against its field. Returns (value, None) on success or
+    (None, error message).
+    """
+    if field.type == 'file':
+        if raw is None:
+            return None, f'Please upload your {field.label}'
+        return raw, None
+    if field.type == 'select':
+        if raw in field.options:
+            return raw, None
+        return None, f'Invalid option. Please choose from {list(field.options)}'
+    if field.type == 'number':
+        try:
+            return float(raw), None
+        except (TypeError, ValueError):
+            return None, f'Please provide a valid numeric input for {field.label}'
+    if raw and str(raw).strip():
+        return raw, None
+    return None, f'Please provide a valid input for {field.label}'
+
+
+def is_filled(field, value) -> bool:
+    if field.type == 'file':
+        return value is not None
+    if field.type == 'number':
+        return value not in ("", None)
+    return bool(value)
+
+
+class FormState:
+    __slots__ = ('schema', 'values', '_cursor')
+
+    def __init__(self, schema: FormSchema, values=None):
+        """
+        :param values: one value per schema field; defaults to the schema's
+            empty values
+        """
+        self.schema = schema
+        self.values = list(values) if values is not None else [field.template["value"] for field in schema.fields]
+        # Every required field before this position in schema.required_indexes is filled
+        self._cursor = 0
+
+    @classmethod
+    def new(cls, schema: FormSchema, user_info: Dict[str, str]) -> 'FormState':
+        state = cls(schema)
+        for index in schema.prefill_indexes:
+            state.values[index] = user_info.get(schema.fields[index].prefill, '')
+        return state
+
+    def next_missing(self) -> Optional[int]:
+        """
+        Index of the first required field still empty, or None when the
+        form is complete. Values are never cleared, so the cursor only
+        moves forward and repeated calls cost O(1) amortized.
+        """
+        required = self.schema.required_indexes
+        fields = self.schema.fields
+        while self._cursor < len(required) and is_filled(fields[required[self._cursor]], self.values[required[self._cursor]]):
+            self._cursor += 1
+        return required[self._cursor] if self._cursor < len(required) else None
+
+    @property
+    def complete(self) -> bool:
+        return self.next_missing() is None
+
+    def set_value(self, index: int, raw) -> Optional[str]:
+        """
+        Validate and store one field's input, touching no other field.
+        Returns an error message, or None if the value was accepted.
+        """
+        value, error = validate_value(self.schema.fields[index], raw)
+        if error is None:
+            self.values[index] = value
+        return error
+
+    def field(self, index: int) -> Dict[str, Any]:
+        """
+        One field in the generate_form_fields dict format, with its value.
+        """
+        return dict(self.schema.fields[index].template, value=self.values[index])
+
+    def fields(self):
+        return [self.field(index) for index in range(len(self.values))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Compact JSON-friendly state: only values that differ from the
+        field defaults, keyed by field index, and the cursor so a rebuilt
+        state doesn't rescan the required fields already filled.
+        """
+        defaults = self.schema.fields
+        return {
+            "form_type": self.schema.form_type,
+            "values": {
+                str(index): list(value) if isinstance(value, BlobRef) else value
+                for index, value in enumerate(self.values)
+                if value != defaults[index].template["value"]
+            },
+            "cursor": self._cursor,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], registry: FormSchemaRegistry) -> 'FormState':
+        """
+        Rebuild a state saved with to_dict(), taking the schema from the
+        registry. Form types it doesn't know have no fields.
+        """
+        schema = registry.get(data["form_type"]) or FormSchema(data["form_type"], data["form_type"], [])
+        state = cls(schema)
+        for key, value in data["values"].items():
+            index = int(key)
+            state.values[index] = BlobRef(*value) if schema.fields[index].type == 'file' else value
+        state._cursor = min(data.get("cursor", 0), len(schema.required_indexes))
+        return state
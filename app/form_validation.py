@@ -0,0 +1,220 @@
+"""
+Local rule-based validation for the tax filing form.
+
+Format checks (SSN, email syntax, numeric income and deductions) are
+answered here with compiled regular expressions and type coercion. A form
+only goes to GrokAPI.validate_and_fill_form when a field is missing or its
+value is ambiguous, which is when the model's suggestions are worth a
+network call. Forms with plainly invalid values are rejected locally,
+because the model cannot repair a mistyped SSN either.
+
+validate_batch() runs the same rules over columnar arrays of submissions
+and returns NumPy arrays, for bulk checks of thousands of forms at once.
+"""
+import re
+from typing import Any, Dict, Sequence, Tuple
+
+import numpy as np
+
+from metrics import Counter
+
+FORM_FIELDS = ('name', 'email', 'ssn', 'income', 'deductions')
+
+FIELD_LABELS = {
+    'name': 'Name',
+    'email': 'Email',
+    'ssn': 'SSN',
+    'income': 'Annual Income',
+    'deductions': 'Deductions',
+}
+
+# Per-field outcome codes, also used as int8 values in batch results
+VALID, MISSING, AMBIGUOUS, INVALID = 0, 1, 2, 3
+
+NAME_RE = re.compile(r"[^\W\d_]+(?:[ .'-]+[^\W\d_]+)*\.?")
+EMAIL_RE = re.compile(r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}")
+# Area 000, 666 and 900-999, group 00 and serial 0000 are never issued
+SSN_RE = re.compile(r"(?!000|666|9\d\d)(\d{3})[- ]?(?!00)(\d{2})[- ]?(?!0000)(\d{4})")
+MONEY_RE = re.compile(r"\$?\s*(\d{1,3}(?:,\d{3})+|\d+)(\.\d{1,2})?\s*([kKmM])?")
+
+MONEY_SUFFIXES = {'k': 1e3, 'm': 1e6}
+
+VALIDATION_PATHS = Counter(
+    'form_assistant_validation_path_total',
+    'Tax form validations by the path that answered them',
+    ('path', 'status'),
+)
+
+
+def _check_text(pattern, message):
+    def check(raw):
+        return (raw, VALID, None) if pattern.fullmatch(raw) else (None, INVALID, message)
+    return check
+
+
+def _check_ssn(raw):
+    match = SSN_RE.fullmatch(raw)
+    if not match:
+        return None, INVALID, 'expected 9 digits in the form AAA-GG-SSSS'
+    return '-'.join(match.groups()), VALID, None
+
+
+def _check_money(raw):
+    match = MONEY_RE.fullmatch(raw)
+    if not match:
+        return None, INVALID, 'expected a non-negative amount such as 52000 or $52,000.00'
+    value = float(match[1].replace(',', '') + (match[2] or ''))
+    if match[3]:
+        # "50k" is probably 50,000, but that is a guess worth confirming
+        return value * MONEY_SUFFIXES[match[3].lower()], AMBIGUOUS, f'read "{raw}" as an abbreviated amount'
+    return value, VALID, None
+
+
+FIELD_CHECKS = {
+    'name': _check_text(NAME_RE, 'should contain only letters, spaces, apostrophes and hyphens'),
+    'email': _check_text(EMAIL_RE, 'not a valid email address'),
+    'ssn': _check_ssn,
+    'income': _check_money,
+    'deductions': _check_money,
+}
+
+
+def check_field(field: str, raw) -> Tuple[Any, int, str]:
+    """
+    Coerce one raw input. Returns (value, outcome code, message or None).
+    """
+    raw = "" if raw is None else str(raw).strip()
+    if not raw:
+        return None, MISSING, 'is required'
+    return FIELD_CHECKS[field](raw)
+
+
+def validate_form(form_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate one tax form locally.
+
+    "status" is "valid", "invalid" (reject without calling the model) or
+    "escalate" (something is missing or ambiguous). "values" holds the
+    coerced values of the fields that passed.
+    """
+    values, errors, missing, ambiguous = {}, {}, [], []
+    for field in FORM_FIELDS:
+        value, code, message = check_field(field, form_data.get(field))
+        if code == INVALID:
+            errors[field] = message
+            continue
+        if code == MISSING:
+            missing.append(field)
+            continue
+        values[field] = value
+        if code == AMBIGUOUS:
+            ambiguous.append(field)
+
+    if values.get('deductions') is not None and values.get('income') is not None \
+            and values['deductions'] > values['income'] and 'deductions' not in ambiguous:
+        ambiguous.append('deductions')
+
+    if errors:
+        status = "invalid"
+    elif missing or ambiguous:
+        status = "escalate"
+    else:
+        status = "valid"
+
+    return {
+        "status": status,
+        "values": values,
+        "errors": errors,
+        "missing_fields": missing,
+        "ambiguous_fields": ambiguous,
+    }
+
+
+def format_values(values: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Coerced values as display strings, in form field order.
+    """
+    return {
+        field: f"{values[field]:.2f}" if isinstance(values[field], float) else values[field]
+        for field in FORM_FIELDS if field in values
+    }
+
+
+def _route(form_data):
+    """
+    Returns (result, local response), or (result, form data for the model)
+    when the form has to be escalated.
+    """
+    result = validate_form(form_data)
+    if result["status"] == "valid":
+        return result, format_values(result["values"])
+    if result["status"] == "invalid":
+        return result, {"error": "; ".join(
+            f"{FIELD_LABELS[field]}: {message}" for field, message in result["errors"].items()
+        )}
+    # The model sees the cleaned-up values, but ambiguous ones as entered
+    settled = {field: value for field, value in result["values"].items() if field not in result["ambiguous_fields"]}
+    return result, dict(form_data, **format_values(settled))
+
+
+def validate_and_fill(form_data: Dict[str, Any], grok_api) -> Tuple[Dict[str, Any], str]:
+    """
+    Validate locally and only call grok_api.validate_and_fill_form when
+    needed. Returns (response, path) where path is "local" or "llm"; the
+    response has the same shape as GrokAPI.validate_and_fill_form's.
+    """
+    result, response = _route(form_data)
+    if result["status"] != "escalate":
+        VALIDATION_PATHS.inc(path='local', status=result["status"])
+        return response, 'local'
+
+    VALIDATION_PATHS.inc(path='llm', status=result["status"])
+    return grok_api.validate_and_fill_form(response), 'llm'
+
+
+async def avalidate_and_fill(form_data: Dict[str, Any], grok_api) -> Tuple[Dict[str, Any], str]:
+    """
+    validate_and_fill() for an AsyncGrokAPI.
+    """
+    result, response = _route(form_data)
+    if result["status"] != "escalate":
+        VALIDATION_PATHS.inc(path='local', status=result["status"])
+        return response, 'local'
+
+    VALIDATION_PATHS.inc(path='llm', status=result["status"])
+    return await grok_api.validate_and_fill_form(response), 'llm'
+
+
+def validate_batch(columns: Dict[str, Sequence[Any]]) -> Dict[str, Any]:
+    """
+    Validate many submissions given as columns ({field: values}, all the
+    same length). Returns NumPy arrays, one element per submission:
+
+    - "status": "valid", "invalid" or "escalate", as in validate_form()
+    - "codes": {field: int8 outcome codes (VALID, MISSING, ...)}
+    - "values": {field: coerced values; float64 with NaN for amounts}
+    """
+    size = max((len(column) for column in columns.values()), default=0)
+    codes, values = {}, {}
+    for field in FORM_FIELDS:
+        column = columns.get(field)
+        checked = [check_field(field, raw) for raw in column] if column is not None \
+            else [(None, MISSING, None)] * size
+        codes[field] = np.fromiter((code for _, code, _ in checked), dtype=np.int8, count=size)
+        if field in ('income', 'deductions'):
+            values[field] = np.fromiter(
+                (np.nan if value is None else value for value, _, _ in checked), dtype=np.float64, count=size
+            )
+        else:
+            values[field] = np.array([value for value, _, _ in checked], dtype=object)
+
+    # NaN compares False, so only rows with both amounts are affected
+    over = (values['deductions'] > values['income']) & (codes['deductions'] == VALID)
+    codes['deductions'][over] = AMBIGUOUS
+
+    stacked = np.stack([codes[field] for field in FORM_FIELDS])
+    invalid = (stacked == INVALID).any(axis=0)
+    escalate = ~invalid & (stacked != VALID).any(axis=0)
+    status = np.where(invalid, "invalid", np.where(escalate, "escalate", "valid"))
+
+    return {"status": status, "codes": codes, "values": values}
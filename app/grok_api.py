@@ -1,19 +1,40 @@
 import os
-from openai import OpenAI
+import json
+import asyncio
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
+from metrics import instrument, record_usage, start_metrics_exporter
+from resilience import get_resilient_caller, CircuitOpenError
+from prompts import VALIDATION_PROMPT
+
 load_dotenv()
 
 # Initialize Grok client
 XAI_API_KEY = os.getenv("XAI_API_KEY")
-print(XAI_API_KEY)
+XAI_BASE_URL = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")
+
+
+def _validation_messages(form_data):
+    return VALIDATION_PROMPT.render(form_data.get('form_type', ''), form_data=form_data)
+
+
+def _parse_response(raw_response):
+    try:
+        return json.loads(raw_response)
+    except json.JSONDecodeError:
+        return {"message": raw_response}
+
 
 class GrokAPI:
-    def __init__(self):
+    def __init__(self, base_url=None):
         self.client = OpenAI(
             api_key=XAI_API_KEY,
-            base_url="https://api.x.ai/v1",
+            base_url=base_url or XAI_BASE_URL,
+            max_retries=0,
         )
+        self.resilience = get_resilient_caller()
+        start_metrics_exporter()
 
     def validate_and_fill_form(self, form_data):
         """
@@ -22,25 +43,56 @@ class GrokAPI:
         :return: Validated and auto-filled form data or error message
         """
         try:
-            user_message = f"Validate and complete this tax form: {form_data}"
+            with instrument('llm', 'validate_and_fill_form', form_data.get('form_type', '')):
+                completion = self.resilience.call(
+                    'validate_and_fill_form',
+                    lambda timeout: self.client.chat.completions.create(
+                        model="grok-beta",
+                        messages=_validation_messages(form_data),
+                        timeout=timeout,
+                    ),
+                )
+            record_usage(completion.usage, 'validate_and_fill_form', form_data.get('form_type', ''))
 
-            completion = self.client.chat.completions.create(
-                model="grok-beta",
-                messages=[
-                    {"role": "system", "content": "If any fields are missing or incorrect, provide recommended values to auto-fill the form."},
-                    {"role": "user", "content": user_message},
-                ],
-            )
+            return _parse_response(completion.choices[0].message.content)
+        except CircuitOpenError:
+            return {"error": "Form validation is temporarily unavailable. Please try again shortly."}
+        except Exception as e:
+            return {"error": str(e)}
 
-            raw_response = completion.choices[0].message.content
 
-            try:
-                import json
-                response = json.loads(raw_response)
-            except json.JSONDecodeError:
-                response = {"message": raw_response}
+class AsyncGrokAPI:
+    def __init__(self, max_concurrency=16, base_url=None):
+        self.client = AsyncOpenAI(
+            api_key=XAI_API_KEY,
+            base_url=base_url or XAI_BASE_URL,
+            max_retries=0,
+        )
+        self.resilience = get_resilient_caller()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        start_metrics_exporter()
+
+    async def validate_and_fill_form(self, form_data):
+        """
+        Async counterpart of GrokAPI.validate_and_fill_form.
+        :param form_data: Dictionary containing form fields (name, email, etc.)
+        :return: Validated and auto-filled form data or error message
+        """
+        try:
+            async with self._semaphore:
+                with instrument('llm', 'validate_and_fill_form', form_data.get('form_type', '')):
+                    completion = await self.resilience.acall(
+                        'validate_and_fill_form',
+                        lambda timeout: self.client.chat.completions.create(
+                            model="grok-beta",
+                            messages=_validation_messages(form_data),
+                            timeout=timeout,
+                        ),
+                    )
+            record_usage(completion.usage, 'validate_and_fill_form', form_data.get('form_type', ''))
 
-            return response
+            return _parse_response(completion.choices[0].message.content)
+        except CircuitOpenError:
+            return {"error": "Form validation is temporarily unavailable. Please try again shortly."}
         except Exception as e:
             return {"error": str(e)}
-
@@ -0,0 +1,234 @@
+import os
+import re
+import math
+import threading
+from collections import OrderedDict, Counter, defaultdict
+
+DEFAULT_MAX_ENTRIES = int(os.getenv('GUIDANCE_CACHE_SIZE', '512'))
+DEFAULT_POLICY = os.getenv('GUIDANCE_CACHE_POLICY', 'lru')
+DEFAULT_THRESHOLD = float(os.getenv('GUIDANCE_CACHE_THRESHOLD', '0.8'))
+DEFAULT_FUZZY = os.getenv('GUIDANCE_CACHE_FUZZY', '1') != '0'
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+# "can't", "doesn't", "wont" -> "can not", "does not", "will not"
+_NEGATED = re.compile(r"\b(ca|wo|do|does|did|is|are|was|were|has|have|had|should|could|would|must)n['\u2019]?t\b")
+_NEGATED_STEMS = {'ca': 'can', 'wo': 'will'}
+_WHITESPACE = re.compile(r"\s+")
+
+# Question words (how, what, why, ...) and modals (can, should, ...) are
+# not stop words: "Why do you need my SSN?" and "When do you need my SSN?"
+# ask different things and must not share a key
+STOP_WORDS = frozenset("""
+a about am an and any are as at be been being but by did do does doing for
+from had has have having i if in into is it its me my of on or our please so
+than that the their them then there these they this to us was we were with
+you your
+""".split())
+
+
+def _stem(token):
+    # Light suffix stripping so "needed"/"needs"/"needing" share a key
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+# A paraphrase is only served when both questions use exactly the same
+# words from this set: "Can I not file jointly?" is close to "Can I file
+# jointly?" by TF-IDF but asks the opposite, as "Do you need my SSN?" does
+# of "Why do you need my SSN?"
+EXACT_TOKENS = frozenset(_stem(token) for token in """
+not no never nor none neither without
+how what when where which who whom whose why
+can could may might must shall should will would
+""".split())
+
+
+def tokenize(question):
+    text = _NEGATED.sub(lambda m: f"{_NEGATED_STEMS.get(m.group(1), m.group(1))} not", question.lower())
+    text = _PUNCTUATION.sub(' ', text.replace('cannot', 'can not'))
+    return [_stem(token) for token in text.split() if token not in STOP_WORDS]
+
+
+def same_intent(tokens, other_tokens):
+    """
+    Whether two tokenized questions agree on every negation, question word
+    and modal, which TF-IDF similarity alone does not weigh enough.
+    """
+    return EXACT_TOKENS.intersection(tokens) == EXACT_TOKENS.intersection(other_tokens)
+
+
+def normalize_question(question):
+    """
+    Canonical form of a question: lowercase, no punctuation, collapsed
+    whitespace, stop words removed. Falls back to the cleaned text when a
+    question is made only of stop words.
+    """
+    tokens = tokenize(question)
+    if tokens:
+        return ' '.join(tokens)
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', question.lower())).strip()
+
+
+class TfidfMatcher:
+    def __init__(self):
+        """
+        Small TF-IDF index over cached questions for one form type, used to
+        serve paraphrases of questions that were already answered.
+        """
+        self._docs = {}
+        self._doc_freq = Counter()
+        self._vectors = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, key, tokens):
+        if key in self._docs:
+            return
+        self._docs[key] = Counter(tokens)
+        self._doc_freq.update(set(tokens))
+        self._vectors = None
+
+    def remove(self, key):
+        counts = self._docs.pop(key, None)
+        if counts is None:
+            return
+        self._doc_freq.subtract(counts.keys())
+        self._vectors = None
+
+    def _idf(self, token):
+        return math.log((1 + len(self._docs)) / (1 + self._doc_freq.get(token, 0))) + 1
+
+    def _vectorize(self, counts):
+        vector = {token: count * self._idf(token) for token, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if norm:
+            vector = {token: weight / norm for token, weight in vector.items()}
+        return vector
+
+    def best_match(self, tokens):
+        """
+        Return (key, cosine similarity) of the closest stored question.
+        """
+        if not self._docs or not tokens:
+            return None, 0.0
+        if self._vectors is None:
+            self._vectors = {key: self._vectorize(counts) for key, counts in self._docs.items()}
+
+        query = self._vectorize(Counter(tokens))
+        best_key, best_score = None, 0.0
+        for key, vector in self._vectors.items():
+            score = sum(weight * vector.get(token, 0.0) for token, weight in query.items())
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+
+class GuidanceCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, policy=DEFAULT_POLICY,
+                 similarity_threshold=DEFAULT_THRESHOLD, fuzzy=DEFAULT_FUZZY):
+        """
+        In-process cache of ask_form_guidance answers keyed on form_type and
+        the normalized question.
+
+        :param policy: 'lru' evicts the least recently used answer, 'lfu' the
+            least frequently served one
+        :param similarity_threshold: minimum TF-IDF cosine similarity for a
+            paraphrase to be served from the cache; it must also use the
+            same EXACT_TOKENS
+        :param fuzzy: disable to only serve exact normalized matches
+        """
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+
+        self.max_entries = max_entries
+        self.policy = policy
+        self.similarity_threshold = similarity_threshold
+        self.fuzzy = fuzzy
+
+        self._entries = OrderedDict()
+        self._frequency = Counter()
+        self._matchers = defaultdict(TfidfMatcher)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _touch(self, key):
+        self._entries.move_to_end(key)
+        self._frequency[key] += 1
+
+    def get(self, form_type, question):
+        """
+        Return a cached answer for the question or a close paraphrase of it.
+        """
+        tokens = tokenize(question)
+        key = (form_type, normalize_question(question))
+
+        with self._lock:
+            if key in self._entries:
+                self._touch(key)
+                self.hits += 1
+                return self._entries[key]
+
+            if self.fuzzy:
+                match, score = self._matchers[form_type].best_match(tokens)
+                if (match is not None and score >= self.similarity_threshold
+                        and same_intent(tokens, match[1].split())):
+                    self._touch(match)
+                    self.fuzzy_hits += 1
+                    return self._entries[match]
+
+            self.misses += 1
+            return None
+
+    def set(self, form_type, question, answer):
+        key = (form_type, normalize_question(question))
+
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[key] = answer
+            self._touch(key)
+            self._matchers[form_type].add(key, tokenize(question))
+
+    def _evict(self):
+        if self.policy == 'lfu':
+            victim = min(self._entries, key=lambda k: self._frequency[k])
+        else:
+            victim = next(iter(self._entries))
+
+        del self._entries[victim]
+        del self._frequency[victim]
+        self._matchers[victim[0]].remove(victim)
+        self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_guidance_cache():
+    """
+    Return the process-wide guidance cache. Streamlit re-executes the page
+    script on every rerun, so a per-service cache would start empty each time.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = GuidanceCache()
+        return _default_cache
@@ -1,5 +1,6 @@
 import streamlit as st
 from grok_api import GrokAPI
+from form_validation import validate_and_fill
 
 
 grok_api = GrokAPI()
@@ -19,7 +20,8 @@ form_data = {
 
 if st.button("Validate and Auto-Fill"):
     with st.spinner("Validating and auto-filling the form..."):
-        response = grok_api.validate_and_fill_form(form_data)
+        response, validation_path = validate_and_fill(form_data, grok_api)
+        st.caption("Checked locally" if validation_path == 'local' else "Checked with Grok")
 
         if isinstance(response, dict) and "error" in response:
             st.error(f"Error: {response['error']}")
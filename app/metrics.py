@@ -0,0 +1,291 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Every LLM, database and OCR call made by the form services goes through
+`instrument()`, which records its latency and counts it as an error if it
+raises. Token usage and cache lookups are counted alongside, all labelled by
+method and form_type.
+
+Metrics are exported when METRICS_PORT (serves GET /metrics) and/or
+METRICS_FILE (rewritten every METRICS_FILE_INTERVAL seconds, e.g. for the
+node_exporter textfile collector) are set.
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_FILE = os.getenv('METRICS_FILE', '')
+METRICS_FILE_INTERVAL = float(os.getenv('METRICS_FILE_INTERVAL', '15'))
+
+# Seconds; spans a cached DB lookup through a slow multi-page OCR job
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Monotonic counter with one series per combination of label values.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Cumulative-bucket histogram, rendered in the Prometheus histogram
+        format (_bucket / _sum / _count).
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, seconds, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def count(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[0]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class LatencyTracker:
+    def __init__(self, name, max_samples=1000, register=True):
+        """
+        Rolling window of latency samples (seconds) with percentile summaries.
+        Pass register=False for internal trackers that should not be exported.
+        """
+        self.name = name
+        self._samples = deque(maxlen=max_samples)
+        self._count = 0
+        self._total = 0.0
+        self._lock = threading.Lock()
+        if register:
+            _registry.append(self)
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+            self._total += seconds
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'count': self._count,
+            'mean': self._total / self._count if self._count else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+    def render(self):
+        lines = [f"# HELP {self.name} Rolling-window latency summary", f"# TYPE {self.name} summary"]
+        for q in (50, 95, 99):
+            value = self.percentile(q)
+            if value is not None:
+                lines.append(f'{self.name}{{quantile="{q / 100}"}} {value}')
+        lines.append(f"{self.name}_sum {self._total}")
+        lines.append(f"{self.name}_count {self._count}")
+        return lines
+
+
+# Time from sending a streaming guidance request to the first content token
+GUIDANCE_TTFT = LatencyTracker('guidance_time_to_first_token_seconds')
+
+CALL_LATENCY = Histogram(
+    'form_assistant_call_duration_seconds',
+    'Latency of LLM, database and OCR calls',
+    ('kind', 'method', 'form_type'),
+)
+CALL_ERRORS = Counter(
+    'form_assistant_call_errors_total',
+    'LLM, database and OCR calls that raised',
+    ('kind', 'method', 'form_type'),
+)
+LLM_TOKENS = Counter(
+    'form_assistant_llm_tokens_total',
+    'Tokens reported in response.usage',
+    ('method', 'form_type', 'type'),
+)
+LLM_COALESCED = Counter(
+    'form_assistant_llm_coalesced_total',
+    'LLM calls answered by sharing an identical in-flight request',
+    ('method', 'form_type'),
+)
+CACHE_REQUESTS = Counter(
+    'form_assistant_cache_requests_total',
+    'Cache lookups by outcome',
+    ('cache', 'method', 'form_type', 'result'),
+)
+
+
+@contextmanager
+def instrument(kind, method, form_type=""):
+    """
+    Time the block as one `kind` ('llm', 'db' or 'ocr') call, counting it
+    as an error if it raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        CALL_ERRORS.inc(kind=kind, method=method, form_type=form_type)
+        raise
+    finally:
+        CALL_LATENCY.observe(time.perf_counter() - started, kind=kind, method=method, form_type=form_type)
+
+
+def record_usage(usage, method, form_type=""):
+    """
+    Count prompt/completion tokens from a response's `usage`, if any.
+    """
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, method=method, form_type=form_type, type='prompt')
+    LLM_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, method=method, form_type=form_type, type='completion')
+
+
+def record_cache(cache, method, form_type, hit):
+    CACHE_REQUESTS.inc(cache=cache, method=method, form_type=form_type, result='hit' if hit else 'miss')
+
+
+def render_metrics():
+    """
+    All registered metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    # Write-then-rename so a scraper never reads a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def start_metrics_exporter(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_FILE_INTERVAL):
+    """
+    Start the HTTP endpoint and/or file writer once per process. Services
+    call this on construction; it does nothing unless a port or path is
+    configured.
+    """
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started or not (port or path):
+            return
+        _exporter_started = True
+
+    if port:
+        try:
+            server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+        except OSError as e:
+            print(f"Failed to start metrics endpoint on port {port}: {e}")
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+
+    if path:
+        def write_periodically():
+            while True:
+                try:
+                    write_metrics(path)
+                except OSError as e:
+                    print(f"Failed to write metrics to {path}: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=write_periodically, name='metrics-file', daemon=True).start()
@@ -0,0 +1,108 @@
+"""
+Versioned schema migrations for tax_data.db.
+
+The applied version is tracked in PRAGMA user_version. Run this module to
+bring an existing database up to date:
+
+    python app/migrations.py [path/to/tax_data.db]
+"""
+import sys
+import sqlite3
+
+from db import hash_ssn, SSN_HASH_SCHEMA_VERSION
+
+
+def _base_schema(conn):
+    # Individual statements rather than executescript(), which would commit
+    # the migration's transaction early
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        email TEXT UNIQUE,
+        ssn TEXT UNIQUE,
+        address TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS tax_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        year INTEGER,
+        income REAL,
+        deductions REAL,
+        tax_paid REAL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+
+def _hashed_ssn_and_covering_indexes(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+    if 'ssn_hash' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN ssn_hash TEXT")
+
+    conn.create_function("hash_ssn", 1, hash_ssn, deterministic=True)
+    conn.execute("UPDATE users SET ssn_hash = hash_ssn(ssn) WHERE ssn_hash IS NULL AND ssn IS NOT NULL")
+
+    # Covering indexes: the user lookup and the per-user tax history are
+    # answered from the index alone, without touching the table rows.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_ssn_hash ON users(ssn_hash, name, email, address)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tax_records_user_year "
+        "ON tax_records(user_id, year, income, deductions, tax_paid)"
+    )
+    conn.execute("ANALYZE")
+
+
+def _address_index(conn):
+    # Review screening counts the users at a submitted address per request
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_address ON users(address COLLATE NOCASE)")
+    conn.execute("ANALYZE")
+
+
+MIGRATIONS = [
+    (1, "base users and tax_records tables", _base_schema),
+    (SSN_HASH_SCHEMA_VERSION, "keyed ssn_hash column and covering indexes", _hashed_ssn_and_covering_indexes),
+    (3, "case-insensitive users.address index", _address_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION, verbose=False):
+    """
+    Apply every pending migration up to `target`, each in its own
+    transaction. `conn` must be in autocommit mode (isolation_level=None).
+    Returns the resulting schema version.
+    """
+    version = current_version(conn)
+    for number, description, apply in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        if verbose:
+            print(f"Applying migration {number}: {description}")
+        conn.execute("BEGIN")
+        try:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        version = number
+    return version
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'tax_data.db'
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        version = migrate(conn, verbose=True)
+        print(f"{db_path} is at schema version {version}")
+    finally:
+        conn.close()
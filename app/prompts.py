@@ -0,0 +1,213 @@
+"""
+Prompt templates for the form services.
+
+Every prompt is a PromptTemplate compiled once at import. Its static text
+is dedented and whitespace-normalized (request data is sent as given, so
+OCR table alignment survives), and always comes first: the system
+message, then the instructions. The per-request data (form type, user
+details, document text) follows in a fixed order. Requests of one kind
+therefore share a byte-identical prefix that provider-side prompt caching
+can reuse.
+
+Before each request the prompt's tokens are counted with
+chunking.estimate_tokens against the budget for its form type
+(PROMPT_TOKEN_BUDGET, overridable per form type with PROMPT_TOKEN_BUDGETS,
+a JSON object). Over budget, the template's truncatable sections are cut
+down in order until it fits. room_for() tells callers how much of the
+budget a section can have, so documents can be chunked to fit instead.
+"""
+import os
+import re
+import json
+import textwrap
+from typing import Any, Dict, List, Sequence, Tuple
+
+from chunking import estimate_tokens
+from metrics import Counter
+
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '8000'))
+PROMPT_TOKEN_BUDGETS = json.loads(os.getenv('PROMPT_TOKEN_BUDGETS', '{}'))
+
+TRUNCATION_MARKER = " [truncated]"
+
+_TRAILING_SPACE = re.compile(r"[ \t]+(?=\n|$)")
+_INLINE_SPACE = re.compile(r"[ \t]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+PROMPT_TOKENS = Counter(
+    'form_assistant_prompt_tokens_total',
+    'Estimated prompt tokens sent, counted before each request',
+    ('template', 'form_type'),
+)
+PROMPT_TRUNCATIONS = Counter(
+    'form_assistant_prompt_truncations_total',
+    'Prompts cut down to fit their token budget',
+    ('template', 'form_type'),
+)
+
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Collapse runs of spaces and blank lines. Newlines and page separators
+    are kept.
+    """
+    text = _INLINE_SPACE.sub(" ", text.replace("\r\n", "\n"))
+    return _BLANK_LINES.sub("\n\n", _TRAILING_SPACE.sub("", text)).strip()
+
+
+def format_value(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        # Compact JSON: the indentation and spaces are tokens too
+        return json.dumps(value, separators=(',', ':'), default=str)
+    return str(value)
+
+
+def budget_for(form_type: str) -> int:
+    return int(PROMPT_TOKEN_BUDGETS.get(form_type, DEFAULT_PROMPT_TOKEN_BUDGET))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Keep the head of `text` within `max_tokens`, marking the cut.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens - estimate_tokens(TRUNCATION_MARKER))
+    # Shrink by the token ratio until the estimate fits; usually one step
+    end = len(text)
+    while end and estimate_tokens(text[:end]) > limit:
+        end = min(end - 1, int(end * limit / estimate_tokens(text[:end])))
+    return text[:end].rstrip() + TRUNCATION_MARKER if end else ""
+
+
+class PromptTemplate:
+    __slots__ = ('name', 'system', 'instructions', 'sections', 'truncatable', 'static_tokens')
+
+    def __init__(self, name: str, system: str, instructions: str, sections: Sequence[Tuple[str, str]],
+                 truncatable: Sequence[str] = ()):
+        """
+        :param sections: (value name, heading) pairs, rendered in this order
+            after the instructions; a None or empty value omits its section
+        :param truncatable: value names that may be cut to fit the budget,
+            first to be cut first
+        """
+        self.name = name
+        self.system = normalize_whitespace(textwrap.dedent(system))
+        self.instructions = normalize_whitespace(textwrap.dedent(instructions))
+        self.sections = tuple(sections)
+        self.truncatable = tuple(truncatable)
+        self.static_tokens = estimate_tokens(self.system) + estimate_tokens(self.instructions)
+
+    def _sections(self, form_type, values):
+        """
+        ({name: formatted value}, {name: tokens with its heading}) for the
+        sections that have a value.
+        """
+        values["form_type"] = form_type
+        parts = {name: format_value(values[name]) for name, _ in self.sections if values.get(name) not in (None, "")}
+        counts = {name: estimate_tokens(f"{heading}:\n{parts[name]}") for name, heading in self.sections
+                  if name in parts}
+        return parts, counts
+
+    def room_for(self, section: str, form_type: str, budget: int = None, **values) -> int:
+        """
+        Tokens left for `section` once the static text and the other
+        sections in `values` are counted: the most that section can hold
+        without anything being truncated.
+        """
+        _, counts = self._sections(form_type, values)
+        heading = dict(self.sections)[section]
+        budget = budget_for(form_type) if budget is None else budget
+        used = self.static_tokens + sum(count for name, count in counts.items() if name != section)
+        # One more for a token the tokenizer may merge across the heading
+        return budget - used - estimate_tokens(f"{heading}:\n") - 1
+
+    def render(self, form_type: str, budget: int = None, **values) -> List[Dict[str, str]]:
+        """
+        Build the chat messages for one request, within `budget` tokens
+        (default: the form type's budget).
+        """
+        parts, counts = self._sections(form_type, values)
+
+        budget = budget_for(form_type) if budget is None else budget
+        overflow = self.static_tokens + sum(counts.values()) - budget
+        if overflow > 0:
+            PROMPT_TRUNCATIONS.inc(template=self.name, form_type=form_type)
+            for name in self.truncatable:
+                if overflow <= 0:
+                    break
+                if name not in parts:
+                    continue
+                text = truncate_to_tokens(parts[name], max(0, estimate_tokens(parts[name]) - overflow))
+                overflow -= counts[name]
+                counts[name] = estimate_tokens(text)
+                overflow += counts[name]
+                parts[name] = text
+
+        PROMPT_TOKENS.inc(self.static_tokens + sum(counts.values()), template=self.name, form_type=form_type)
+        data = "\n\n".join(f"{heading}:\n{parts[name]}" for name, heading in self.sections if name in parts)
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": f"{self.instructions}\n\n{data}"},
+        ]
+
+
+ANALYSIS_PROMPT = PromptTemplate(
+    'analysis',
+    system="You are a helpful government form assistant.",
+    instructions="""
+        You are an expert government form assistant.
+        Analyze the user's current information and the requirements for the form type given below.
+        Provide a comprehensive response with:
+        1. List of missing required fields
+        2. Suggested documents that could help fill those fields
+        3. Specific guidance on obtaining missing information
+        4. Potential red flags or additional verification needs
+    """,
+    sections=(('form_type', 'Form Type'), ('user_info', 'User Information'), ('tax_summary', 'Income History')),
+    truncatable=('tax_summary', 'user_info'),
+)
+
+GUIDANCE_PROMPT = PromptTemplate(
+    'guidance',
+    system="You are a helpful government form guidance assistant.",
+    instructions="""
+        You are an expert government form and agency information assistant.
+        Please provide a comprehensive response to the user's question below that:
+        1. Directly answers the user's specific question
+        2. Provides context about why this information is collected
+        3. Explains the legal basis for collecting this information
+        4. Offers guidance on how to accurately complete the relevant sections
+        5. Highlight any privacy protections or data usage policies
+    """,
+    sections=(('form_type', 'Form Type'), ('user_question', 'User Question')),
+    truncatable=('user_question',),
+)
+
+EXTRACTION_PROMPT = PromptTemplate(
+    'extraction',
+    system="You are an expert document information extractor.",
+    instructions="""
+        Extract structured information from the document text below for the given form type,
+        excluding the details already known about the user.
+        Please provide a JSON response with extracted key-value pairs relevant to the form type.
+    """,
+    sections=(('form_type', 'Form Type'), ('known_info', 'Already Known'), ('text', 'Document Text')),
+    truncatable=('text',),
+)
+
+REVIEW_PROMPT = PromptTemplate(
+    'review',
+    system="You are a fraud detection assistant.",
+    instructions="Analyze these form details for review necessity.",
+    sections=(('form_type', 'Form Type'), ('flags', 'Automated Screening Flagged'), ('form_data', 'Form Details')),
+    truncatable=('form_data',),
+)
+
+VALIDATION_PROMPT = PromptTemplate(
+    'validation',
+    system="If any fields are missing or incorrect, provide recommended values to auto-fill the form.",
+    instructions="Validate and complete this tax form.",
+    sections=(('form_type', 'Form Type'), ('form_data', 'Form')),
+    truncatable=('form_data',),
+)
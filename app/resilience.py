@@ -0,0 +1,288 @@
+"""
+Timeouts, retries, hedging and circuit breaking for upstream LLM calls.
+
+Every chat completion goes through a ResilientCaller, which
+
+- gives each attempt a per-method timeout derived from its latency SLO,
+- retries transient failures (timeouts, connection errors, 429s and 5xx)
+  with full-jitter exponential backoff,
+- optionally hedges: if the first attempt has not answered by the method's
+  observed p95 latency, a duplicate is sent and the first answer wins,
+- trips a circuit breaker after repeated failures, so callers fail fast to
+  the services' mock responses instead of every session hanging on an
+  unhealthy upstream.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import openai
+
+from metrics import LatencyTracker, Counter
+
+DEFAULT_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', '3'))
+DEFAULT_HEDGE = os.getenv('LLM_HEDGE', '0') == '1'
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+
+# Per-attempt timeouts (seconds) from each method's latency SLO. Streaming
+# only waits for the response to start, so its budget is tighter.
+METHOD_TIMEOUTS = {
+    'analyze_form_requirements': 20.0,
+    'ask_form_guidance': 15.0,
+    'stream_form_guidance': 10.0,
+    'determine_review_necessity': 20.0,
+    'process_document_upload': 60.0,
+    'validate_and_fill_form': 20.0,
+}
+
+# Failures worth another attempt; anything else (bad request, auth) is not
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# Hedging needs enough samples for the p95 to mean something
+HEDGE_MIN_SAMPLES = 20
+
+RESILIENCE_EVENTS = Counter(
+    'form_assistant_llm_resilience_events_total',
+    'Retries, hedged requests and circuit breaker rejections',
+    ('method', 'event'),
+)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        """
+        Classic closed / open / half-open breaker. After `failure_threshold`
+        consecutive failures it opens for `reset_timeout` seconds, then lets
+        a single probe through; the probe's outcome closes or re-opens it.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """
+        True while calls would be rejected, without claiming the probe.
+        """
+        with self._lock:
+            if self.state == 'open':
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self.state == 'half_open' and self._probe_in_flight
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("LLM upstream circuit is open")
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._probe_in_flight:
+                    raise CircuitOpenError("LLM upstream circuit is half-open")
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_ignored(self):
+        """
+        The call failed for reasons unrelated to the upstream's health (e.g.
+        a 4xx): neither close nor trip the breaker, but free the half-open
+        probe so the next call can probe instead.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class ResilientCaller:
+    def __init__(self, timeouts=None, default_timeout=DEFAULT_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 base_delay=0.25, max_delay=4.0, hedge=DEFAULT_HEDGE, breaker=None):
+        """
+        :param timeouts: per-method attempt timeouts, overriding METHOD_TIMEOUTS
+        :param hedge: send a duplicate request once an attempt has run past
+            the method's observed p95 latency
+        """
+        self.timeouts = dict(METHOD_TIMEOUTS, **(timeouts or {}))
+        self.default_timeout = default_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self._latency = {}
+        self._latency_lock = threading.Lock()
+        self._hedge_pool = None
+
+    def timeout_for(self, method):
+        return self.timeouts.get(method, self.default_timeout)
+
+    def _tracker(self, method):
+        with self._latency_lock:
+            tracker = self._latency.get(method)
+            if tracker is None:
+                tracker = self._latency[method] = LatencyTracker(f'{method}_latency', register=False)
+            return tracker
+
+    def hedge_delay(self, method):
+        """
+        Seconds to wait before hedging, or None when hedging is off or
+        there is not enough history yet.
+        """
+        tracker = self._tracker(method)
+        if not self.hedge or tracker.summary()['count'] < HEDGE_MIN_SAMPLES:
+            return None
+        return tracker.percentile(95)
+
+    def backoff(self, attempt):
+        # Full jitter: spreads retries from many sessions instead of
+        # synchronizing them into waves
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, method, fn, hedge=True):
+        """
+        Call fn(timeout) with retries, hedging and circuit breaking. Raises
+        CircuitOpenError without calling fn while the upstream is unhealthy.
+        Pass hedge=False for calls that must not be duplicated (streams).
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            RESILIENCE_EVENTS.inc(method=method, event='rejected')
+            raise
+        timeout = self.timeout_for(method)
+        for attempt in range(self.max_attempts):
+            started = time.perf_counter()
+            try:
+                delay = self.hedge_delay(method) if hedge else None
+                result = fn(timeout) if delay is None else self._hedged(method, fn, timeout, delay)
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_attempts - 1:
+                    self.breaker.record_failure()
+                    raise
+                RESILIENCE_EVENTS.inc(method=method, event='retry')
+                time.sleep(self.backoff(attempt))
+                continue
+            except Exception:
+                # Not the upstream's health (e.g. a bad request): neither
+                # trip nor close the breaker
+                self.breaker.record_ignored()
+                raise
+            self._tracker(method).observe(time.perf_counter() - started)
+            self.breaker.record_success()
+            return result
+
+    def _hedged(self, method, fn, timeout, delay):
+        if self._hedge_pool is None:
+            with self._latency_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='llm-hedge')
+
+        primary = self._hedge_pool.submit(fn, timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        RESILIENCE_EVENTS.inc(method=method, event='hedge')
+        pending = {primary, self._hedge_pool.submit(fn, timeout)}
+        error = None
+        # First success wins; the slower request finishes in the background
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, method, fn, hedge=True):
+        """
+        asyncio counterpart of call(); fn(timeout) returns an awaitable.
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            RESILIENCE_EVENTS.inc(method=method, event='rejected')
+            raise
+        timeout = self.timeout_for(method)
+        for attempt in range(self.max_attempts):
+            started = time.perf_counter()
+            try:
+                delay = self.hedge_delay(method) if hedge else None
+                result = await (fn(timeout) if delay is None else self._ahedged(method, fn, timeout, delay))
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_attempts - 1:
+                    self.breaker.record_failure()
+                    raise
+                RESILIENCE_EVENTS.inc(method=method, event='retry')
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            except Exception:
+                self.breaker.record_ignored()
+                raise
+            self._tracker(method).observe(time.perf_counter() - started)
+            self.breaker.record_success()
+            return result
+
+    async def _ahedged(self, method, fn, timeout, delay):
+        primary = asyncio.ensure_future(fn(timeout))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        RESILIENCE_EVENTS.inc(method=method, event='hedge')
+        pending = {primary, asyncio.ensure_future(fn(timeout))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Unlike threads, the losing coroutine can actually be cancelled
+            for task in pending:
+                task.cancel()
+
+
+_default_caller = None
+_default_lock = threading.Lock()
+
+
+def get_resilient_caller():
+    """
+    Return the process-wide caller, so every service instance and session
+    shares one view of upstream health and latency.
+    """
+    global _default_caller
+    with _default_lock:
+        if _default_caller is None:
+            _default_caller = ResilientCaller()
+        return _default_caller
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+from db import get_pool
+
+DEFAULT_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', 'response_cache.db')
+DEFAULT_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '86400'))
+DEFAULT_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '10000'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries(accessed_at);
+
+CREATE TABLE IF NOT EXISTS cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+"""
+
+
+def stable_hash(payload):
+    """
+    SHA-256 of a JSON payload with sorted keys, so equal dicts hash equally
+    regardless of insertion order.
+    """
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def make_key(namespace, form_type, payload):
+    return f"{namespace}:{form_type}:{stable_hash(payload)}"
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        SQLite-backed response cache with TTL expiry and LRU eviction.
+
+        The cache lives in a local file, so every server process shares it
+        and entries survive restarts. Hit, miss and eviction counters are
+        kept in the same file.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        conn = sqlite3.connect(path, timeout=5.0)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.pool = get_pool(path, read_only=False)
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute("UPDATE cache_stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get(self, key):
+        """
+        Return the cached value for `key`, or None on a miss or expiry.
+        """
+        now = time.time()
+        try:
+            with self.pool.connection() as conn, conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is None:
+                    self._bump(conn, 'misses')
+                    return None
+
+                if self.ttl and now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                    self._bump(conn, 'misses')
+                    self._bump(conn, 'evictions')
+                    return None
+
+                conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._bump(conn, 'hits')
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"Response cache error: {e}")
+            return None
+
+    def set(self, key, value):
+        """
+        Store `value` under `key` and evict least recently used entries
+        beyond `max_entries`.
+        """
+        now = time.time()
+        try:
+            with self.pool.connection() as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM cache_entries WHERE key IN "
+                        "(SELECT key FROM cache_entries ORDER BY accessed_at ASC LIMIT ?)",
+                        (overflow,)
+                    )
+                    self._bump(conn, 'evictions', overflow)
+        except sqlite3.Error as e:
+            print(f"Response cache error: {e}")
+
+    def purge_expired(self):
+        """
+        Drop every entry older than the TTL. Returns the number removed.
+        """
+        if not self.ttl:
+            return 0
+        try:
+            with self.pool.connection() as conn, conn:
+                removed = conn.execute(
+                    "DELETE FROM cache_entries WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+                self._bump(conn, 'evictions', removed)
+                return removed
+        except sqlite3.Error as e:
+            print(f"Response cache error: {e}")
+            return 0
+
+    def clear(self):
+        try:
+            with self.pool.connection() as conn, conn:
+                conn.execute("DELETE FROM cache_entries")
+        except sqlite3.Error as e:
+            print(f"Response cache error: {e}")
+
+    def stats(self):
+        """
+        Return hit, miss and eviction counters plus the current entry count.
+        """
+        try:
+            with self.pool.connection() as conn:
+                stats = dict(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+                stats['entries'] = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+                return stats
+        except sqlite3.Error as e:
+            print(f"Response cache error: {e}")
+            return {}
@@ -0,0 +1,323 @@
+"""
+Local anomaly pre-screen ahead of the LLM review in determine_review_necessity.
+
+Submissions are scored against population statistics from tax_records:
+
+- robust z-scores of log income, the deduction ratio (deductions / income)
+  and the effective tax rate (tax_paid / income),
+- the income jump versus the filer's previous year,
+- how many other registered users share the filer's address.
+
+Each signal is scaled so that 1.0 is the level worth a second look, and a
+submission's score is its strongest signal. Only submissions scoring at or
+above the threshold, or with no amounts to score, go on to the LLM.
+
+The population medians and MADs are estimated from a random sample of
+REVIEW_STATS_SAMPLE_SIZE tax records, fetched by rowid, and refreshed in a
+background thread once older than REVIEW_STATS_MAX_AGE. A request only
+reads its filer's history and counts the users at the submitted address
+(case-insensitively, through idx_users_address).
+
+Scoring is vectorized, so the same code scores one form or the whole user
+base in one pass, e.g. for a nightly review queue:
+
+    python app/review_screening.py [path/to/tax_data.db]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from db import find_tax_records, BULK_LOOKUP_CHUNK_SIZE
+from form_validation import check_field, AMBIGUOUS, VALID
+from metrics import Counter
+from tax_history import OUTLIER_THRESHOLD, load_cohort, safe_ratio
+
+REVIEW_SCORE_THRESHOLD = float(os.getenv('REVIEW_SCORE_THRESHOLD', '1.0'))
+# Relative income change from the previous year that counts as a jump
+YOY_JUMP = float(os.getenv('REVIEW_YOY_JUMP', '1.0'))
+# Other registered users at one address that counts as suspicious
+DUPLICATE_ADDRESS_LIMIT = int(os.getenv('REVIEW_DUPLICATE_ADDRESS_LIMIT', '3'))
+# Population statistics are refreshed after this many seconds
+STATS_MAX_AGE = float(os.getenv('REVIEW_STATS_MAX_AGE', '3600'))
+# Tax records sampled to estimate them
+STATS_SAMPLE_SIZE = int(os.getenv('REVIEW_STATS_SAMPLE_SIZE', '100000'))
+
+MAX_RECORD_ID_SQL = "SELECT MAX(id) FROM tax_records"
+ALL_AMOUNTS_SQL = "SELECT income, deductions, tax_paid FROM tax_records"
+SAMPLED_AMOUNTS_SQL = "SELECT income, deductions, tax_paid FROM tax_records WHERE id IN ({})"
+ADDRESS_COUNT_SQL = "SELECT COUNT(*) FROM users WHERE address = ? COLLATE NOCASE"
+USER_ADDRESS_COUNTS_SQL = (
+    "SELECT u.id, c.filers FROM users u JOIN "
+    "(SELECT address, COUNT(*) AS filers FROM users GROUP BY address COLLATE NOCASE) c "
+    "ON u.address = c.address COLLATE NOCASE"
+)
+
+ROUTINE_REVIEW_ANALYSIS = (
+    "Automated screening found nothing unusual in this submission compared with other filers, "
+    "so no manual review is expected."
+)
+
+REVIEW_SCREENING = Counter(
+    'form_assistant_review_screening_total',
+    'Review pre-screen outcomes: routine (no LLM call), flagged or unavailable',
+    ('result',),
+)
+
+SIGNALS = ('income_z', 'deduction_ratio_z', 'effective_rate_z', 'income_yoy', 'duplicate_address')
+
+SIGNAL_REASONS = {
+    'income_z': 'income is far from the population norm',
+    'deduction_ratio_z': 'deductions are unusual relative to income',
+    'effective_rate_z': 'effective tax rate is unusual',
+    'income_yoy': 'income changed sharply from the previous year',
+    'duplicate_address': 'address is shared with several other filers',
+}
+
+def _median_mad(values):
+    values = values[np.isfinite(values)]
+    if not values.size:
+        return np.nan, np.nan
+    median = np.median(values)
+    return median, np.median(np.abs(values - median))
+
+
+def _feature_columns(income, deductions, tax_paid):
+    return {
+        'income_z': np.log1p(np.maximum(income, 0)),
+        'deduction_ratio_z': safe_ratio(deductions, income),
+        'effective_rate_z': safe_ratio(tax_paid, income),
+    }
+
+
+def _amount(form_data, key):
+    # Every amount shares the income field's parsing rules
+    value, code, _ = check_field('income', form_data.get(key))
+    return value if code in (VALID, AMBIGUOUS) else np.nan
+
+
+def sample_amounts(conn: sqlite3.Connection, size=STATS_SAMPLE_SIZE, seed=None) -> np.ndarray:
+    """
+    (income, deductions, tax_paid) rows for about `size` random tax records,
+    as an (n, 3) array. Records are picked by random id, so the cost does not
+    grow with the table; all of them are read when the table is smaller.
+    """
+    max_id = conn.execute(MAX_RECORD_ID_SQL).fetchone()[0] or 0
+    if max_id <= size:
+        rows = conn.execute(ALL_AMOUNTS_SQL).fetchall()
+    else:
+        # Duplicates and ids of deleted rows only shrink the sample a little
+        ids = np.unique(np.random.default_rng(seed).integers(1, max_id + 1, size)).tolist()
+        sql = SAMPLED_AMOUNTS_SQL.format(','.join('?' * BULK_LOOKUP_CHUNK_SIZE))
+        rows = []
+        for start in range(0, len(ids), BULK_LOOKUP_CHUNK_SIZE):
+            chunk = ids[start:start + BULK_LOOKUP_CHUNK_SIZE]
+            # Padded so every chunk reuses one prepared statement
+            rows.extend(conn.execute(sql, chunk + chunk[:1] * (BULK_LOOKUP_CHUNK_SIZE - len(chunk))))
+    return np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+
+def address_count(conn: sqlite3.Connection, address) -> int:
+    """
+    Registered users at `address`, ignoring case.
+    """
+    address = str(address or '').strip()
+    return conn.execute(ADDRESS_COUNT_SQL, (address,)).fetchone()[0] if address else 0
+
+
+class ReviewScreener:
+    def __init__(self, amounts: np.ndarray, threshold=REVIEW_SCORE_THRESHOLD):
+        """
+        :param amounts: (n, 3) array of income, deductions and tax_paid for a
+            sample of tax records, the population the baselines come from
+        """
+        self.threshold = threshold
+        features = _feature_columns(amounts[:, 0], amounts[:, 1], amounts[:, 2])
+        self.baselines = {name: _median_mad(values) for name, values in features.items()}
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection, sample_size=STATS_SAMPLE_SIZE, **kwargs) -> 'ReviewScreener':
+        return cls(sample_amounts(conn, sample_size), **kwargs)
+
+    def score(self, income, deductions, tax_paid, previous_income, other_filers):
+        """
+        Score aligned arrays of submissions. Returns (scores, {signal: array});
+        a score is NaN where no amount-based signal could be computed.
+        """
+        signals = {}
+        for name, values in _feature_columns(income, deductions, tax_paid).items():
+            median, mad = self.baselines[name]
+            signals[name] = np.abs(0.6745 * safe_ratio(values - median, np.full_like(values, mad))) / OUTLIER_THRESHOLD
+        signals['income_yoy'] = np.abs(safe_ratio(income - previous_income, previous_income)) / YOY_JUMP
+        # fmax ignores NaN signals, unlike max
+        scores = np.fmax.reduce(np.vstack([signals[name] for name in SIGNALS[:-1]]), axis=0)
+        signals['duplicate_address'] = np.maximum(other_filers, 0) / DUPLICATE_ADDRESS_LIMIT
+        # Without any amounts there is nothing to vouch for the submission,
+        # so it stays unscored rather than passing on the address alone
+        scores = np.where(np.isnan(scores), np.nan, np.fmax(scores, signals['duplicate_address']))
+        return scores, signals
+
+    def screen(self, form_data: Dict[str, Any], history=(), filers_at_address=0) -> Dict[str, Any]:
+        """
+        Score one submission. `history` is the filer's
+        [(year, income, deductions, tax_paid), ...], oldest first. When the
+        form states no income, the latest year on file is screened instead.
+        `filers_at_address` is the registered users at the form's address.
+        """
+        submitted = np.array([_amount(form_data, key) for key in ('income', 'deductions', 'tax_paid')])
+        if np.isnan(submitted[0]) and history:
+            # Nothing new to compare: screen the latest year on file against the one before
+            current = np.array(history[-1][1:], dtype=np.float64)
+            previous_income = history[-2][1] if len(history) > 1 else np.nan
+        else:
+            current = submitted
+            previous_income = history[-1][1] if history else np.nan
+
+        # A registered filer is already counted at their own address
+        other_filers = max(filers_at_address - 1, 0) if history else filers_at_address
+
+        scores, signals = self.score(
+            current[0:1], current[1:2], current[2:3],
+            np.array([previous_income], dtype=np.float64), np.array([other_filers], dtype=np.float64)
+        )
+        score = float(scores[0])
+        values = {name: float(signals[name][0]) for name in SIGNALS if np.isfinite(signals[name][0])}
+        return {
+            "score": None if np.isnan(score) else round(score, 3),
+            # With nothing to score, leave the call to the LLM
+            "review": bool(np.isnan(score) or score >= self.threshold),
+            "signals": {name: round(value, 3) for name, value in values.items()},
+            "reasons": [SIGNAL_REASONS[name] for name, value in values.items() if value >= self.threshold],
+        }
+
+    def score_population(self, records: np.ndarray, address_counts: Dict[int, int]) -> Dict[str, np.ndarray]:
+        """
+        Score every user's latest tax year in one pass, highest score first,
+        e.g. to build a nightly review queue.
+
+        :param records: tax_history.RECORD_DTYPE array sorted by user, year
+        :param address_counts: {user_id: registered users at their address}
+        """
+        user_id = records['user_id']
+        last = np.ones(len(records), dtype=bool)
+        last[:-1] = user_id[1:] != user_id[:-1]
+
+        previous_income = np.full(len(records), np.nan)
+        same_user = np.zeros(len(records), dtype=bool)
+        same_user[1:] = user_id[1:] == user_id[:-1]
+        previous_income[1:] = np.where(same_user[1:], records['income'][:-1], np.nan)
+
+        latest = records[last]
+        other_filers = np.fromiter(
+            (address_counts.get(user, 1) - 1 for user in latest['user_id'].tolist()), dtype=np.float64, count=len(latest)
+        )
+
+        scores, signals = self.score(
+            latest['income'], latest['deductions'], latest['tax_paid'], previous_income[last], other_filers
+        )
+        ranking = np.argsort(-np.nan_to_num(scores, nan=np.inf), kind='stable')
+        return {
+            'user_id': latest['user_id'][ranking],
+            'year': latest['year'][ranking],
+            'score': scores[ranking],
+            'review': (np.isnan(scores) | (scores >= self.threshold))[ranking],
+            'signals': {name: values[ranking] for name, values in signals.items()},
+        }
+
+
+def review_queue(conn: sqlite3.Connection, threshold=REVIEW_SCORE_THRESHOLD):
+    """
+    [{"user_id", "year", "score", "reasons"}, ...] for every user that
+    needs review, highest score first.
+    """
+    screener = ReviewScreener.from_connection(conn, threshold=threshold)
+    scored = screener.score_population(load_cohort(conn), dict(conn.execute(USER_ADDRESS_COUNTS_SQL)))
+    queue = []
+    for index in np.flatnonzero(scored['review']):
+        score = scored['score'][index]
+        queue.append({
+            "user_id": int(scored['user_id'][index]),
+            "year": int(scored['year'][index]),
+            "score": None if np.isnan(score) else round(float(score), 3),
+            "reasons": [SIGNAL_REASONS[name] for name in SIGNALS if scored['signals'][name][index] >= threshold],
+        })
+    return queue
+
+
+# db_path -> (screener, monotonic time it was built)
+_screeners = {}
+# db_paths whose screener is being built
+_building = set()
+_screeners_lock = threading.Lock()
+
+
+def _build_screener(pool) -> Optional[ReviewScreener]:
+    try:
+        with pool.connection() as conn:
+            screener = ReviewScreener.from_connection(conn)
+    except sqlite3.Error as e:
+        print(f"Failed to load review screening statistics: {e}")
+        screener = None
+    with _screeners_lock:
+        _building.discard(pool.db_path)
+        if screener is not None:
+            _screeners[pool.db_path] = (screener, time.monotonic())
+    return screener
+
+
+def get_review_screener(pool) -> Optional[ReviewScreener]:
+    """
+    Return the screener for a pool's database. The lock only guards the
+    lookup: the first call builds the screener itself, and once its
+    statistics are older than STATS_MAX_AGE a background thread rebuilds
+    them while the old ones keep serving. None while the first build is in
+    progress elsewhere or when the data can't be loaded.
+    """
+    with _screeners_lock:
+        cached = _screeners.get(pool.db_path)
+        if cached and time.monotonic() - cached[1] < STATS_MAX_AGE:
+            return cached[0]
+        if pool.db_path in _building:
+            return cached[0] if cached else None
+        _building.add(pool.db_path)
+
+    if cached:
+        threading.Thread(target=_build_screener, args=(pool,), name='review-stats', daemon=True).start()
+        return cached[0]
+    return _build_screener(pool)
+
+
+def screen_submission(pool, form_data, ssn=None) -> Optional[Dict[str, Any]]:
+    """
+    Screen one submission, with the filer's tax history when `ssn` is
+    given. None when screening is unavailable.
+    """
+    screener = get_review_screener(pool)
+    if screener is None:
+        REVIEW_SCREENING.inc(result='unavailable')
+        return None
+    try:
+        history = find_tax_records(pool, ssn) if ssn else []
+        with pool.connection() as conn:
+            filers = address_count(conn, form_data.get('address'))
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        history, filers = [], 0
+    screening = screener.screen(form_data, history, filers)
+    REVIEW_SCREENING.inc(result='flagged' if screening["review"] else 'routine')
+    return screening
+
+
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'tax_data.db'
+    conn = sqlite3.connect(db_path)
+    try:
+        for entry in review_queue(conn):
+            print(json.dumps(entry))
+    finally:
+        conn.close()
@@ -0,0 +1,140 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+When many sessions send the same prompt at the same moment (a cohort
+landing on one agency page), only the first caller goes upstream; the rest
+wait for that call and share its result or exception. Nothing is kept once
+the call completes, so this complements rather than replaces the response
+and guidance caches.
+"""
+import asyncio
+import threading
+
+from response_cache import stable_hash
+
+
+def request_fingerprint(model, messages, **kwargs):
+    """
+    Key identifying an upstream request: same model, messages and options
+    means the same answer can be shared.
+    """
+    return stable_hash({"model": model, "messages": messages, "options": kwargs})
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Thread-safe coalescing group for blocking calls.
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call with the same key is already in flight, in
+        which case wait for it. Returns (result, shared), where shared is
+        True for callers that reused another caller's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared, 'in_flight': len(self._calls)}
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        """
+        Coalescing group for coroutines running on one event loop.
+        """
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """
+        Await fn() unless the same key is already in flight. Returns
+        (result, shared) like SingleFlight.do.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            # Shielded so a cancelled follower does not cancel the leader
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.calls += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved, so an unshared failure does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+
+_default_group = None
+_default_lock = threading.Lock()
+
+
+def get_single_flight():
+    """
+    Return the process-wide group, so calls are coalesced across every
+    service instance and Streamlit session in the process.
+    """
+    global _default_group
+    with _default_lock:
+        if _default_group is None:
+            _default_group = SingleFlight()
+        return _default_group
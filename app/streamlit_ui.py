@@ -1,102 +1,60 @@
 import streamlit as st
-from form_assistance import FormAssistantService
+from blob_store import get_blob_store
+from form_schema import FormSchema
+from form_state import FormState
+from ui_cache import get_service, set_scope, clear_session_cache, cached_user_info
 
 class InteractiveFormFiller:
-    def __init__(self, assistant, form_type, user_info):
-        self.assistant = assistant
-        self.form_type = form_type
-        self.user_info = user_info
-        
-        # Generate initial form fields
-        form_fields_response = self.assistant.generate_form_fields(form_type, user_info)
-        self.form_fields = form_fields_response['fields']
-        
-        # Pre-fill known information from user_info
-        self._pre_fill_known_fields()
+    __slots__ = ('state',)
 
-    def _pre_fill_known_fields(self):
+    def __init__(self, state: FormState):
         """
-        Pre-fill fields with known information from user_info
+        Chat-style filler over a FormState. Only state.to_dict() lives in
+        session; the schema is shared from the registry.
         """
-        known_fields = {
-            'Full Name': self.user_info.get('name', ''),
-            'Email': self.user_info.get('email', ''),
-            'Address': self.user_info.get('address', ''),
-            'Social Security Number': self.user_info.get('ssn', '')
-        }
+        self.state = state
+
+    @classmethod
+    def create(cls, assistant, form_type, user_info):
+        schema = assistant.form_registry.get(form_type) or FormSchema(form_type, form_type, [])
+        return cls(FormState.new(schema, user_info))
 
-        for field in self.form_fields:
-            if field['label'] in known_fields and known_fields[field['label']]:
-                field['value'] = known_fields[field['label']]
+    @classmethod
+    def restore(cls, assistant, data):
+        return cls(FormState.from_dict(data, assistant.form_registry))
+
+    @property
+    def form_fields(self):
+        return self.state.fields()
 
     def get_next_missing_field(self):
         """
-        Find the next field that needs to be filled
-        Considers a field empty if it has no value or is an empty string/None
+        Find the next required field that needs to be filled
         """
-        for field in self.form_fields:
-            # Check if field is required and truly empty
-            if field['required']:
-                # For text, email, date, number fields
-                if field['type'] in ['text', 'email', 'date', 'number', 'select']:
-                    if not field['value']:
-                        return field
-                
-                # For file uploads
-                elif field['type'] == 'file':
-                    if field['value'] is None:
-                        return field
-        
-        return None
+        index = self.state.next_missing()
+        return None if index is None else self.state.field(index)
 
     def process_user_input(self, user_input):
         """
-        Process user input for the current field
+        Process user input for the current field. File fields expect a
+        BlobRef rather than the uploaded file itself.
         """
-        current_field = self.get_next_missing_field()
+        index = self.state.next_missing()
         
-        if current_field is None:
+        if index is None:
             return {
                 'status': 'completed',
                 'message': 'All required fields have been filled!'
             }
         
-        # Validate and store input based on field type
         try:
-            if current_field['type'] == 'file':
-                # For file uploads, expect a file object
-                if user_input is not None:
-                    current_field['value'] = user_input
-                else:
-                    return {
-                        'status': 'error',
-                        'message': f'Please upload your {current_field["label"]}'
-                    }
-            elif current_field['type'] == 'select':
-                if user_input in current_field['options']:
-                    current_field['value'] = user_input
-                else:
-                    return {
-                        'status': 'error',
-                        'message': f'Invalid option. Please choose from {current_field["options"]}'
-                    }
-            elif current_field['type'] in ['text', 'email', 'date']:
-                if user_input and user_input.strip():
-                    current_field['value'] = user_input
-                else:
-                    return {
-                        'status': 'error',
-                        'message': f'Please provide a valid input for {current_field["label"]}'
-                    }
-            elif current_field['type'] == 'number':
-                try:
-                    numeric_input = float(user_input)
-                    current_field['value'] = numeric_input
-                except ValueError:
-                    return {
-                        'status': 'error',
-                        'message': f'Please provide a valid numeric input for {current_field["label"]}'
-                    }
+            # Validates only the field being filled
+            error = self.state.set_value(index, user_input)
+            if error:
+                return {
+                    'status': 'error',
+                    'message': error
+                }
             
             # Return next step
             next_field = self.get_next_missing_field()
@@ -118,14 +76,22 @@ class InteractiveFormFiller:
                 'message': f'An error occurred: {str(e)}'
             }
 
+def store_upload(uploaded_file):
+    """
+    Spool an uploaded file to the blob store and return the small handle
+    the form state keeps instead of the file.
+    """
+    uploaded_file.seek(0)
+    return get_blob_store().put(uploaded_file, uploaded_file.name)
+
 def main():
     st.title("🏛️ AI Interactive Form Assistant")
 
     # Initialize session state variables
     if 'verified_ssn' not in st.session_state:
         st.session_state.verified_ssn = None
-    if 'interactive_form' not in st.session_state:
-        st.session_state.interactive_form = None
+    if 'form_state' not in st.session_state:
+        st.session_state.form_state = None
     if 'form_chat_history' not in st.session_state:
         st.session_state.form_chat_history = []
     if 'form_completed' not in st.session_state:
@@ -135,8 +101,8 @@ def main():
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
 
-    # Initialize the form assistant service
-    assistant = FormAssistantService()
+    # Process-wide service, shared across reruns and sessions
+    assistant = get_service('form_assistance')
 
     # Sidebar for agency selection
     st.sidebar.header("Government Agencies")
@@ -170,6 +136,12 @@ def main():
     }
     form_type = agency_form_map[selected_agency]
 
+    # A different agency means a different form: start it afresh
+    if set_scope(st.session_state.verified_ssn, form_type) and st.session_state.form_state is not None:
+        st.session_state.form_state = None
+        st.session_state.form_chat_history = []
+        st.session_state.form_completed = False
+
     # SSN Verification (only once)
     if not st.session_state.verified_ssn:
         st.header("SSN Verification")
@@ -181,7 +153,7 @@ def main():
                 return
 
             # Retrieve user info
-            user_info = assistant.retrieve_user_info(ssn)
+            user_info = cached_user_info(assistant, ssn)
 
             if "message" not in user_info and "error" not in user_info:
                 st.session_state.verified_ssn = ssn
@@ -194,13 +166,17 @@ def main():
     if st.session_state.verified_ssn:
         # Apply Mode
         if st.session_state.current_mode == 'Apply':
-            # Initialize interactive form if not already done
-            if st.session_state.interactive_form is None:
-                st.session_state.interactive_form = InteractiveFormFiller(
+            # Initialize interactive form if not already done, otherwise
+            # rebuild it from the values kept in session
+            if st.session_state.form_state is None:
+                form_filler = InteractiveFormFiller.create(
                     assistant, 
                     form_type, 
                     st.session_state.user_info
                 )
+                st.session_state.form_state = form_filler.state.to_dict()
+            else:
+                form_filler = InteractiveFormFiller.restore(assistant, st.session_state.form_state)
 
             # Form Completion Logic
             if not st.session_state.form_completed:
@@ -215,7 +191,7 @@ def main():
 
                 # If no chat history, start with first prompt
                 if not st.session_state.form_chat_history:
-                    first_field = st.session_state.interactive_form.get_next_missing_field()
+                    first_field = form_filler.get_next_missing_field()
                     if first_field:
                         st.session_state.form_chat_history.append({
                             'role': 'system', 
@@ -226,7 +202,7 @@ def main():
 
                 # File upload for file-type fields
                 uploaded_file = None
-                current_field = st.session_state.interactive_form.get_next_missing_field()
+                current_field = form_filler.get_next_missing_field()
                 
                 if current_field and current_field['type'] == 'file':
                     uploaded_file = st.file_uploader(
@@ -247,8 +223,12 @@ def main():
                         })
                     
                     # Process the input
-                    input_to_process = uploaded_file if current_field and current_field['type'] == 'file' else user_input
-                    result = st.session_state.interactive_form.process_user_input(input_to_process)
+                    if current_field and current_field['type'] == 'file':
+                        input_to_process = store_upload(uploaded_file) if uploaded_file else None
+                    else:
+                        input_to_process = user_input
+                    result = form_filler.process_user_input(input_to_process)
+                    st.session_state.form_state = form_filler.state.to_dict()
 
                     # Handle different processing results
                     if result['status'] == 'continue':
@@ -273,7 +253,7 @@ def main():
                 st.header("Form Submission Preview")
                 
                 # Display all filled fields
-                for field in st.session_state.interactive_form.form_fields:
+                for field in form_filler.form_fields:
                     st.write(f"**{field['label']}**: {field['value']}")
                 
                 col1, col2 = st.columns(2)
@@ -310,29 +290,30 @@ def main():
                     'content': user_input
                 })
                 
-                # Get guidance from assistant
-                guidance = assistant.ask_form_guidance(
-                    form_type,
-                    user_input
-                )
+                st.chat_message("user").write(user_input)
                 
-                # Add assistant response to chat history
-                response = guidance.get('guidance', 'I apologize, but I cannot provide a specific answer at this moment.')
+                # Stream guidance from assistant as it is generated
+                with st.chat_message("assistant"):
+                    response = st.write_stream(
+                        assistant.stream_form_guidance(form_type, user_input)
+                    )
+                
+                # Add assistant response to chat history once complete
+                if not response:
+                    response = 'I apologize, but I cannot provide a specific answer at this moment.'
                 st.session_state.chat_history.append({
                     'role': 'assistant',
                     'content': response
                 })
-                
-                # Rerun to display the new messages
-                st.experimental_rerun()
 
         # Reset SSN Verification
         if st.sidebar.button("Reset SSN Verification"):
             st.session_state.verified_ssn = None
-            st.session_state.interactive_form = None
+            st.session_state.form_state = None
             st.session_state.form_chat_history = []
             st.session_state.form_completed = False
             st.session_state.chat_history = []
+            clear_session_cache()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
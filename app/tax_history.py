@@ -0,0 +1,180 @@
+import sqlite3
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from db import find_tax_records
+
+# Robust z-score (median / MAD) above which a year is called an outlier
+OUTLIER_THRESHOLD = 3.5
+
+COHORT_SQL = "SELECT user_id, year, income, deductions, tax_paid FROM tax_records ORDER BY user_id, year"
+
+RECORD_DTYPE = np.dtype([
+    ('user_id', np.int64),
+    ('year', np.int32),
+    ('income', np.float64),
+    ('deductions', np.float64),
+    ('tax_paid', np.float64),
+])
+
+
+def safe_ratio(numerator, denominator):
+    """
+    Elementwise numerator / denominator, NaN where the denominator is 0.
+    """
+    out = np.full(np.shape(numerator), np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def robust_z(values, axis=None):
+    """
+    Median/MAD z-score, which unlike mean/std is not dragged around by the
+    very outliers it is meant to find.
+    """
+    median = np.nanmedian(values, axis=axis, keepdims=True)
+    mad = np.nanmedian(np.abs(values - median), axis=axis, keepdims=True)
+    return 0.6745 * safe_ratio(values - median, mad)
+
+
+def history_arrays(records):
+    """
+    Turn [(year, income, deductions, tax_paid), ...] into column arrays.
+    """
+    data = np.array(records, dtype=np.float64).reshape(-1, 4)
+    return {
+        'year': data[:, 0].astype(np.int32),
+        'income': data[:, 1],
+        'deductions': data[:, 2],
+        'tax_paid': data[:, 3],
+    }
+
+
+def summarize_history(records) -> Optional[Dict[str, Any]]:
+    """
+    Year-over-year deltas, effective rates and outlier years for one user.
+    """
+    if not records:
+        return None
+    h = history_arrays(records)
+    income, deductions, tax_paid = h['income'], h['deductions'], h['tax_paid']
+
+    effective_rate = safe_ratio(tax_paid, income)
+    income_yoy = safe_ratio(np.diff(income), income[:-1])
+
+    outliers = {}
+    if len(income) >= 3:
+        for name, values in (('income', income), ('deductions', deductions), ('effective_rate', effective_rate)):
+            flagged = h['year'][np.abs(robust_z(values)).ravel() > OUTLIER_THRESHOLD]
+            if flagged.size:
+                outliers[name] = flagged.tolist()
+
+    return {
+        'years': [int(h['year'][0]), int(h['year'][-1])],
+        'latest_income': float(income[-1]),
+        'latest_deductions': float(deductions[-1]),
+        'latest_tax_paid': float(tax_paid[-1]),
+        'mean_effective_rate': float(np.nanmean(effective_rate)),
+        'latest_income_yoy': float(income_yoy[-1]) if income_yoy.size else None,
+        'max_income_yoy': float(np.nanmax(np.abs(income_yoy))) if income_yoy.size else None,
+        'outliers': outliers,
+    }
+
+
+def format_summary(summary: Optional[Dict[str, Any]]) -> str:
+    """
+    Compact one-paragraph rendering of a summary for the analysis prompt.
+    """
+    if not summary:
+        return "No tax history on file."
+    first, last = summary['years']
+    parts = [
+        f"Tax history {first}-{last}:",
+        f"latest income {summary['latest_income']:,.0f},",
+        f"deductions {summary['latest_deductions']:,.0f},",
+        f"tax paid {summary['latest_tax_paid']:,.0f};",
+        f"mean effective rate {summary['mean_effective_rate']:.1%}",
+    ]
+    if summary['latest_income_yoy'] is not None:
+        parts[-1] += ";"
+        parts.append(f"income change last year {summary['latest_income_yoy']:+.1%}")
+    if summary['outliers']:
+        flagged = ", ".join(f"{name} in {', '.join(map(str, years))}" for name, years in summary['outliers'].items())
+        parts[-1] += ";"
+        parts.append(f"unusual {flagged}")
+    return " ".join(parts) + "."
+
+
+def user_tax_summary(pool, ssn) -> Optional[Dict[str, Any]]:
+    return summarize_history(find_tax_records(pool, ssn))
+
+
+def load_cohort(conn: sqlite3.Connection, sql: str = COHORT_SQL, params=()) -> np.ndarray:
+    """
+    Load tax records into one structured array, sorted by user and year.
+    """
+    rows = conn.execute(sql, params)
+    return np.fromiter((tuple(row) for row in rows), dtype=RECORD_DTYPE)
+
+
+def cohort_metrics(records: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized metrics for a whole cohort in one pass, aligned with
+    `records` (which must be sorted by user_id, then year).
+
+    - effective_rate: tax_paid / income
+    - income_yoy / deductions_yoy: change versus the same user's previous
+      year (NaN on each user's first year)
+    - rate_z: robust z-score of the effective rate within each tax year
+    - outlier: |rate_z| or |income_yoy_z| beyond OUTLIER_THRESHOLD
+    """
+    income = records['income']
+    deductions = records['deductions']
+    effective_rate = safe_ratio(records['tax_paid'], income)
+
+    same_user = np.zeros(len(records), dtype=bool)
+    same_user[1:] = records['user_id'][1:] == records['user_id'][:-1]
+
+    income_yoy = np.full(len(records), np.nan)
+    deductions_yoy = np.full(len(records), np.nan)
+    income_yoy[1:] = safe_ratio(np.diff(income), income[:-1])
+    deductions_yoy[1:] = safe_ratio(np.diff(deductions), deductions[:-1])
+    income_yoy[~same_user] = np.nan
+    deductions_yoy[~same_user] = np.nan
+
+    # Per-year robust z-scores; one vectorized pass per distinct tax year
+    rate_z = np.full(len(records), np.nan)
+    years, inverse = np.unique(records['year'], return_inverse=True)
+    for index in range(len(years)):
+        mask = inverse == index
+        rate_z[mask] = robust_z(effective_rate[mask]).ravel()
+
+    yoy_z = robust_z(income_yoy).ravel()
+    outlier = (np.abs(rate_z) > OUTLIER_THRESHOLD) | (np.abs(yoy_z) > OUTLIER_THRESHOLD)
+
+    return {
+        'user_id': records['user_id'],
+        'year': records['year'],
+        'effective_rate': effective_rate,
+        'income_yoy': income_yoy,
+        'deductions_yoy': deductions_yoy,
+        'rate_z': rate_z,
+        'income_yoy_z': yoy_z,
+        'outlier': outlier,
+    }
+
+
+def cohort_summary(records: np.ndarray) -> Dict[str, Any]:
+    """
+    Cohort-level aggregates, e.g. for nightly reports.
+    """
+    metrics = cohort_metrics(records)
+    return {
+        'users': int(np.unique(records['user_id']).size),
+        'records': int(len(records)),
+        'median_income': float(np.median(records['income'])) if len(records) else None,
+        'median_effective_rate': float(np.nanmedian(metrics['effective_rate'])) if len(records) else None,
+        'outlier_records': int(metrics['outlier'].sum()),
+        'outlier_users': int(np.unique(metrics['user_id'][metrics['outlier']]).size),
+    }
@@ -0,0 +1,106 @@
+"""
+Caching helpers for the Streamlit front ends.
+
+Streamlit re-executes the page script on every widget interaction, so
+anything built or fetched in the script body is rebuilt or re-fetched on
+every click. This module keeps:
+
+- services (and their OpenAI clients, DB pools and caches) as process-wide
+  singletons via st.cache_resource, and
+- expensive per-user results (user info, tax summary, form analysis)
+  memoized in st.session_state, scoped to the verified SSN and the
+  selected form type and dropped when either changes.
+"""
+import importlib
+
+import streamlit as st
+
+_MEMO_KEY = '_ui_memo'
+_SCOPE_KEY = '_ui_memo_scope'
+
+
+@st.cache_resource
+def get_service(module_name):
+    """
+    One FormAssistantService per process for the given module
+    ('form_assistance' or 'modified_form'), shared by all sessions.
+    """
+    return importlib.import_module(module_name).FormAssistantService()
+
+
+def _memo():
+    if _MEMO_KEY not in st.session_state:
+        st.session_state[_MEMO_KEY] = {}
+    return st.session_state[_MEMO_KEY]
+
+
+def _succeeded(result):
+    """
+    Only real results are worth keeping: not a failed lookup (None), an
+    error, or a mock answer given while the LLM was unavailable.
+    """
+    if result is None:
+        return False
+    return not (isinstance(result, dict) and ("error" in result or "message" in result or result.get("mock")))
+
+
+def memoize(name, ssn, form_type, compute):
+    """
+    Return compute() memoized for this session under (name, ssn,
+    form_type). Pass form_type=None for results that only depend on the
+    user. Error and mock results are not memoized, so the next rerun
+    retries.
+    """
+    key = (name, ssn, form_type)
+    memo = _memo()
+    if key in memo:
+        return memo[key]
+    result = compute()
+    if _succeeded(result):
+        memo[key] = result
+    return result
+
+
+def set_scope(ssn, form_type):
+    """
+    Record the session's current SSN and form type, dropping memoized
+    results for any other SSN and form-specific results for any other form
+    type (the user's own data survives an agency change). Returns True if
+    the scope changed.
+    """
+    scope = (ssn, form_type)
+    if st.session_state.get(_SCOPE_KEY) == scope:
+        return False
+
+    memo = _memo()
+    for key in [key for key in memo if key[1] != ssn or key[2] not in (None, form_type)]:
+        del memo[key]
+    st.session_state[_SCOPE_KEY] = scope
+    return True
+
+
+def clear_session_cache():
+    """
+    Forget every memoized result for this session, e.g. on SSN reset.
+    """
+    _memo().clear()
+    st.session_state.pop(_SCOPE_KEY, None)
+
+
+def cached_user_info(assistant, ssn):
+    return memoize('user_info', ssn, None, lambda: assistant.retrieve_user_info(ssn))
+
+
+def cached_tax_summary(assistant, ssn):
+    return memoize('tax_summary', ssn, None, lambda: assistant.get_tax_history_summary(ssn))
+
+
+def cached_form_analysis(assistant, ssn, user_info, form_type):
+    """
+    Form analysis for the session's user, computed once per SSN and form
+    type instead of once per rerun.
+    """
+    return memoize('analysis', ssn, form_type, lambda: assistant.analyze_form_requirements(
+        user_info, form_type, cached_tax_summary(assistant, ssn)
+    ))
+
@@ -0,0 +1,91 @@
+"""
+Benchmark user lookups: connect-per-call (old retrieve_user_info) versus the
+pooled, read-only access layer in app/db.py.
+
+Usage: python scripts/benchmark_db.py [--users 10000] [--lookups 20000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from db import ConnectionPool, USER_BY_SSN_SQL
+
+
+def build_database(path, users):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        email TEXT UNIQUE,
+        ssn TEXT UNIQUE,
+        address TEXT
+    );
+    """)
+    conn.executemany(
+        "INSERT INTO users (name, email, ssn, address) VALUES (?, ?, ?, ?)",
+        ((f"User {i}", f"user{i}@example.com", f"{i:09d}", f"{i} Main St") for i in range(users)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def lookup_unpooled(db_path, ssn):
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT name, email, address
+            FROM users
+            WHERE ssn = ?
+        ''', (ssn,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def lookup_pooled(pool, ssn):
+    with pool.connection() as conn:
+        return conn.execute(USER_BY_SSN_SQL, (ssn,)).fetchone()
+
+
+def run(lookup, sessions, ssns):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        for _ in executor.map(lookup, ssns):
+            pass
+    return len(ssns) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        build_database(db_path, args.users)
+        ssns = [f"{random.randrange(args.users):09d}" for _ in range(args.lookups)]
+
+        print(f"{'sessions':>8} {'before (lookups/s)':>20} {'after (lookups/s)':>20} {'speedup':>8}")
+        for sessions in args.sessions:
+            before = run(lambda ssn: lookup_unpooled(db_path, ssn), sessions, ssns)
+
+            pool = ConnectionPool(db_path, size=sessions)
+            after = run(lambda ssn: lookup_pooled(pool, ssn), sessions, ssns)
+            pool.close()
+
+            print(f"{sessions:>8} {before:>20,.0f} {after:>20,.0f} {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
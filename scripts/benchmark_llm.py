@@ -0,0 +1,244 @@
+"""
+Benchmark the app's own overhead around LLM calls, fully offline.
+
+Starts scripts/llm_stub_server.py on a free local port, points
+FormAssistantService and GrokAPI at it via base_url, then times every public
+method and reports p50/p95/p99 latency, throughput and error rate. Document
+uploads use generated PDF and PNG fixtures.
+
+Caches are bypassed unless --warm-caches is given, so every call pays for a
+full round trip to the stub. The circuit breaker is disabled: with failures
+injected it would open and the services would answer with mock responses,
+which would be timed and counted as successes.
+
+Usage:
+    python scripts/benchmark_llm.py [--requests 50] [--concurrency 4] [--latency-ms 50]
+        [--tokens-per-second 0] [--failure-rate 0.05] [--db tax_data.db]
+"""
+import argparse
+import io
+import json
+import os
+import sqlite3
+import struct
+import subprocess
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'app'))
+
+# Never send a real key to the stub; load_dotenv() does not override this
+os.environ['XAI_API_KEY'] = 'benchmark'
+
+from benchmark_pdf import build_pdf
+from db import get_pool
+from form_assistance import FormAssistantService
+from grok_api import GrokAPI
+from resilience import CircuitBreaker, ResilientCaller
+
+FORM_TYPE = 'tax-return'
+
+
+class _NoGuidanceCache:
+    def get(self, form_type, question):
+        return None
+
+    def set(self, form_type, question, answer):
+        pass
+
+
+def build_png(width=850, height=1100, lines=40):
+    """
+    Minimal 8-bit grayscale PNG with dark bars standing in for text lines.
+    """
+    rows = []
+    for y in range(height):
+        on_line = 40 <= y < 40 + lines * 25 and (y - 40) % 25 < 10
+        rows.append(b"\x00" + (b"\x20" if on_line else b"\xff") * width)
+    raw = zlib.compress(b"".join(rows), 6)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", raw) + chunk(b"IEND", b"")
+
+
+def upload(name, data):
+    stream = io.BytesIO(data)
+    stream.name = name
+    return stream
+
+
+def start_stub(args):
+    command = [
+        sys.executable, os.path.join(SCRIPTS_DIR, "llm_stub_server.py"), "--port", "0",
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--tokens-per-second", str(args.tokens_per_second), "--completion-tokens", str(args.completion_tokens),
+        "--failure-rate", str(args.failure_rate), "--seed", "0",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    banner = process.stdout.readline()
+    if not banner:
+        process.kill()
+        sys.exit("Stub server failed to start")
+    return process, banner.split()[-1]
+
+
+def is_error(result):
+    return isinstance(result, dict) and ("error" in result or result.get("status") == "error")
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+
+def run_case(fn, requests, concurrency):
+    """
+    Call fn(i) for i in range(requests) on `concurrency` threads. Returns
+    (latencies, errors, wall time).
+    """
+    def timed(index):
+        start = time.perf_counter()
+        try:
+            failed = is_error(fn(index))
+        except Exception:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - started
+    return [latency for latency, _ in results], sum(failed for _, failed in results), wall
+
+
+def build_cases(assistant, grok, ssns, args):
+    pdf = build_pdf(args.pdf_pages)
+    png = build_png()
+    user_info = assistant.retrieve_user_info(ssns[0])
+    tax_summary = assistant.get_tax_history_summary(ssns[0])
+    form_data = dict(user_info, income="55000", deductions="12000")
+    # Filled-in fields, so validation walks every field and succeeds
+    fields = [dict(field, value=field.get("value") or "filled")
+              for field in assistant.generate_form_fields(FORM_TYPE, user_info)["fields"]]
+
+    def ssn(i):
+        return ssns[i % len(ssns)]
+
+    def stream_ttft(i):
+        start = time.perf_counter()
+        stream = assistant.stream_form_guidance(FORM_TYPE, f"Which schedule covers freelance income case {i}?")
+        next(stream)
+        ttft_samples.append(time.perf_counter() - start)
+        for _ in stream:
+            pass
+
+    ttft_samples = []
+    cases = [
+        ("retrieve_user_info", lambda i: assistant.retrieve_user_info(ssn(i))),
+        ("retrieve_users_bulk (100)", lambda i: list(assistant.retrieve_users_bulk(
+            [ssn(i + k) for k in range(100)]))),
+        ("get_tax_history_summary", lambda i: assistant.get_tax_history_summary(ssn(i))),
+        ("analyze_form_requirements", lambda i: assistant.analyze_form_requirements(
+            dict(user_info, case=i), FORM_TYPE, tax_summary)),
+        ("ask_form_guidance", lambda i: assistant.ask_form_guidance(
+            FORM_TYPE, f"Can I deduct home office costs case {i}?")),
+        ("stream_form_guidance", stream_ttft),
+        ("determine_review_necessity", lambda i: assistant.determine_review_necessity(dict(form_data, case=i))),
+        ("generate_form_fields", lambda i: assistant.generate_form_fields(FORM_TYPE, user_info)),
+        ("validate_form_fields", lambda i: assistant.validate_form_fields(fields)),
+        ("process_document_upload (pdf)", lambda i: assistant.process_document_upload(
+            user_info, [upload("w2.pdf", pdf + b"%% %d\n" % i)], FORM_TYPE)),
+        ("process_document_upload (png)", lambda i: assistant.process_document_upload(
+            user_info, [upload("scan.png", png + b"%d" % i)], FORM_TYPE)),
+        ("process_document_upload (3 files, parallel)", lambda i: assistant.process_document_upload(
+            user_info,
+            [upload("w2.pdf", pdf + b"%% %d\n" % i), upload("1099.pdf", pdf + b"%% %d-b\n" % i),
+             upload("scan.png", png + b"%d" % i)],
+            FORM_TYPE, parallel=True)),
+        ("GrokAPI.validate_and_fill_form", lambda i: grok.validate_and_fill_form(dict(form_data, case=i))),
+    ]
+    return cases, ttft_samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="calls per method")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--client-retries", type=int, default=None,
+                        help="override the client's own max_retries (0 by default; the resilient caller retries)")
+    parser.add_argument("--pdf-pages", type=int, default=5)
+    parser.add_argument("--db", default="tax_data.db")
+    parser.add_argument("--warm-caches", action="store_true")
+    parser.add_argument("--only", help="run only methods whose name contains this text")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    ssns = [row[0] for row in conn.execute("SELECT ssn FROM users ORDER BY RANDOM() LIMIT 1000")]
+    conn.close()
+    if not ssns:
+        sys.exit(f"No users in {args.db}; populate it with scripts/dummy_data.py")
+
+    stub, base_url = start_stub(args)
+    try:
+        assistant = FormAssistantService(base_url=base_url)
+        assistant.db_pool = get_pool(args.db)
+        grok = GrokAPI(base_url=base_url)
+        # Retries and timeouts as configured, but a breaker that never opens
+        assistant.resilience = grok.resilience = ResilientCaller(breaker=CircuitBreaker(failure_threshold=float('inf')))
+        if args.client_retries is not None:
+            assistant.client = assistant.client.with_options(max_retries=args.client_retries)
+            grok.client = grok.client.with_options(max_retries=args.client_retries)
+        if not args.warm_caches:
+            assistant.response_cache = None
+            assistant.document_cache = None
+            assistant.guidance_cache = _NoGuidanceCache()
+
+        print(f"Stub at {base_url}: {args.latency_ms:g} ms to first token, "
+              f"{args.tokens_per_second:g} tokens/s, {args.failure_rate:.0%} failures; "
+              f"{args.requests} calls per method at concurrency {args.concurrency}\n")
+        print(f"{'method':<46}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls/s':>9}{'errors':>8}")
+
+        cases, ttft_samples = build_cases(assistant, grok, ssns, args)
+        report = []
+        for name, fn in cases:
+            if args.only and args.only not in name:
+                continue
+            samples, errors, wall = run_case(fn, args.requests, args.concurrency)
+            rows = [(name, samples)]
+            if name == "stream_form_guidance" and ttft_samples:
+                rows.append(("stream_form_guidance (first token)", list(ttft_samples)))
+            for label, values in rows:
+                stats = {
+                    "method": label,
+                    "p50_ms": percentile(values, 50) * 1000,
+                    "p95_ms": percentile(values, 95) * 1000,
+                    "p99_ms": percentile(values, 99) * 1000,
+                    "throughput": len(samples) / wall if wall else 0.0,
+                    "errors": errors,
+                }
+                report.append(stats)
+                print(f"{label:<46}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+                      f"{stats['throughput']:>9.1f}{errors:>8}")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark PDF text extraction: the old whole-file `text += page.extract_text()`
+loop versus the page-level extractor in app/document_ingestion.py, on
+synthetic 1, 50 and 500-page PDFs.
+
+Usage: python scripts/benchmark_pdf.py [--pages 1 50 500] [--lines 60]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import PyPDF2
+
+from document_ingestion import extract_pdf_text
+
+
+def build_pdf(pages, lines_per_page=60):
+    """
+    Write a minimal text-layer PDF with `pages` pages, without any PDF
+    authoring dependency.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the kids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1} line {line}: Wages 12345.67 Federal tax withheld 2345.67"
+                 for line in range(lines_per_page)]
+        stream = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(f"({text}) '" for text in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), pages
+    )
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def extract_old(file_content):
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text()
+    return text
+
+
+def extract_new(file_content):
+    return extract_pdf_text(io.BytesIO(file_content), max_pages=0, max_bytes=0, ocr_empty_pages=False)
+
+
+def best_of(fn, arg, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--lines", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'size (KB)':>10} {'before (s)':>11} {'after (s)':>10} {'pages/s':>9}")
+    for pages in args.pages:
+        pdf = build_pdf(pages, args.lines)
+        before = best_of(extract_old, pdf, args.repeat)
+        after = best_of(extract_new, pdf, args.repeat)
+        print(f"{pages:>6} {len(pdf) / 1024:>10.0f} {before:>11.3f} {after:>10.3f} {pages / after:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Check that the hot queries stay index-only and measure their latency.
+
+Builds a synthetic database with scripts/dummy_data.py if --db does not exist
+yet, applies pending migrations, asserts via EXPLAIN QUERY PLAN that every
+hot query is answered from a covering index, then times random lookups.
+The checked queries are the ones the app runs: find_user, the
+find_tax_records join and the find_users_bulk IN query.
+
+Usage: python scripts/benchmark_queries.py [--db bench.db] [--users 10000000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from db import (
+    ConnectionPool, USER_BY_SSN_HASH_SQL, TAX_RECORDS_BY_SSN_HASH_SQL, BULK_LOOKUP_CHUNK_SIZE,
+    DEFAULT_SSN_HASH_KEY, SSN_HASH_KEY, users_bulk_sql, find_user,
+)
+from migrations import migrate
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (query, sample parameters, indexes that must cover it)
+HOT_QUERIES = [
+    (USER_BY_SSN_HASH_SQL, ("0" * 64,), ("idx_users_ssn_hash",)),
+    (TAX_RECORDS_BY_SSN_HASH_SQL, ("0" * 64,), ("idx_users_ssn_hash", "idx_tax_records_user_year")),
+    (users_bulk_sql("ssn_hash"), ("0" * 64,) * BULK_LOOKUP_CHUNK_SIZE, ("idx_users_ssn_hash",)),
+]
+
+
+def check_query_plans(conn):
+    ok = True
+    for sql, params, indexes in HOT_QUERIES:
+        plan = " | ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+        covered = all(f"USING COVERING INDEX {index}" in plan for index in indexes)
+        ok = ok and covered
+        shown = sql if len(sql) < 200 else sql[:200] + "..."
+        print(f"[{'ok' if covered else 'FAIL'}] {shown}\n       {plan}")
+    return ok
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench_tax_data.db")
+    parser.add_argument("--users", type=int, default=10000000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="p99 latency budget per lookup")
+    args = parser.parse_args()
+
+    if SSN_HASH_KEY == DEFAULT_SSN_HASH_KEY.encode('utf-8'):
+        print("WARNING: SSN_HASH_KEY is not set, hashing with the development default. "
+              "Set it to the production key to benchmark a realistic database.", file=sys.stderr)
+
+    if not os.path.exists(args.db):
+        subprocess.run([
+            sys.executable, os.path.join(SCRIPTS_DIR, "dummy_data.py"),
+            "--db", args.db, "--users", str(args.users), "--workers", str(args.workers),
+        ], check=True)
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    migrate(conn, verbose=True)
+    users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    ssns = [row[0] for row in conn.execute(
+        "SELECT ssn FROM users WHERE id IN (%s)" % ",".join(
+            str(random.randint(1, users)) for _ in range(min(args.lookups, 10000))
+        )
+    )]
+    plans_ok = check_query_plans(conn)
+    conn.close()
+
+    pool = ConnectionPool(args.db, size=1)
+    samples = []
+    for i in range(args.lookups):
+        ssn = ssns[i % len(ssns)]
+        start = time.perf_counter()
+        row = find_user(pool, ssn)
+        samples.append(time.perf_counter() - start)
+        assert row is not None, ssn
+    pool.close()
+
+    p50, p99 = percentile(samples, 50) * 1000, percentile(samples, 99) * 1000
+    print(f"{users:,} users, {args.lookups:,} lookups: p50 {p50:.3f} ms, p99 {p99:.3f} ms, "
+          f"{len(samples) / sum(samples):,.0f} lookups/s")
+
+    if not plans_ok or p99 > args.budget_ms:
+        sys.exit(f"FAILED: index-only plans {'ok' if plans_ok else 'missing'}, p99 {p99:.3f} ms "
+                 f"(budget {args.budget_ms} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,187 @@
+"""
+Populate tax_data.db with synthetic users and tax records.
+
+Small runs work as before (python scripts/dummy_data.py). For load testing,
+scale up with e.g.:
+
+    python scripts/dummy_data.py --users 10000000 --start-year 2015 --end-year 2023 --workers 8
+"""
 from faker import Faker
-import sqlite3
+import argparse
+import multiprocessing
+import os
 import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from db import hash_ssn
+from migrations import migrate
+
+# Settings the app runs with; schema migrations run under these, never
+# without a journal
+SAFE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+)
+
+# Bulk-load settings: no rollback journal or fsync while loading, big page
+# cache. The database is switched back to WAL when the load finishes.
+BULK_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA locking_mode=EXCLUSIVE",
+)
+
+POOL_SIZE = 1000
+
+# Only SSNs that form_validation.SSN_RE accepts are generated: area
+# 001-899 except 666, group 01-99, serial 0001-9999
+SSN_AREAS = [area for area in range(1, 900) if area != 666]
+SSN_SPACE = len(SSN_AREAS) * 99 * 9999
+
+# Multiplying by a prime that does not divide SSN_SPACE permutes
+# 0..SSN_SPACE-1, so every user id maps to a distinct, random-looking SSN
+SSN_MULTIPLIER = 2654435761
+
+_pools = None
+
+
+def _init_pools(seed):
+    """
+    Faker is far too slow to call per row at tens of millions of rows, so
+    each worker draws fixed pools of names and addresses once.
+    """
+    global _pools
+    fake = Faker()
+    fake.seed(seed)
+    _pools = {
+        'first': [fake.first_name() for _ in range(POOL_SIZE)],
+        'last': [fake.last_name() for _ in range(POOL_SIZE)],
+        'address': [fake.address() for _ in range(POOL_SIZE)],
+        'domain': [fake.free_email_domain() for _ in range(20)],
+    }
+
+
+def make_ssn(user_id):
+    value = (user_id * SSN_MULTIPLIER) % SSN_SPACE
+    value, serial = divmod(value, 9999)
+    area, group = divmod(value, 99)
+    return f"{SSN_AREAS[area]:03d}-{group + 1:02d}-{serial + 1:04d}"
+
+
+def generate_batch(args):
+    """
+    Build user and tax_record rows for ids [start_id, start_id + count).
+    """
+    start_id, count, start_year, end_year, seed = args
+    rng = random.Random(seed + start_id)
+    first, last, address, domain = _pools['first'], _pools['last'], _pools['address'], _pools['domain']
+
+    users = []
+    records = []
+    for user_id in range(start_id, start_id + count):
+        first_name = rng.choice(first)
+        last_name = rng.choice(last)
+        ssn = make_ssn(user_id)
+        users.append((
+            user_id,
+            f"{first_name} {last_name}",
+            f"{first_name.lower()}.{last_name.lower()}.{user_id}@{rng.choice(domain)}",
+            ssn,
+            hash_ssn(ssn),
+            rng.choice(address),
+        ))
+        for year in range(start_year, end_year + 1):
+            income = round(rng.uniform(30000, 100000), 2)
+            deductions = round(rng.uniform(5000, 20000), 2)
+            tax_paid = income * 0.2 - deductions
+            records.append((user_id, year, income, deductions, tax_paid))
+    return users, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="tax_data.db")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--start-year", type=int, default=2020)
+    parser.add_argument("--end-year", type=int, default=2022)
+    parser.add_argument("--batch-size", type=int, default=50000, help="users per executemany batch")
+    parser.add_argument("--commit-every", type=int, default=20, help="batches per transaction")
+    parser.add_argument("--workers", type=int, default=0, help="generator processes (0 = generate inline)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.end_year < args.start_year:
+        parser.error("--end-year must not be before --start-year")
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    cursor = conn.cursor()
+    # Migrate first, journaled: a crash mid-migration with journal_mode=OFF
+    # could corrupt the existing database
+    for pragma in SAFE_PRAGMAS:
+        cursor.execute(pragma)
+    migrate(conn)
+    for pragma in BULK_PRAGMAS:
+        cursor.execute(pragma)
+
+    first_id = (cursor.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0) + 1
+    batches = [
+        (start, min(args.batch_size, first_id + args.users - start), args.start_year, args.end_year, args.seed)
+        for start in range(first_id, first_id + args.users, args.batch_size)
+    ]
+
+    if args.workers > 0:
+        pool = multiprocessing.Pool(args.workers, initializer=_init_pools, initargs=(args.seed,))
+        results = pool.imap(generate_batch, batches)
+    else:
+        pool = None
+        _init_pools(args.seed)
+        results = map(generate_batch, batches)
+
+    started = time.perf_counter()
+    users_done = 0
+    records_done = 0
+    try:
+        cursor.execute("BEGIN")
+        for number, (users, records) in enumerate(results, start=1):
+            cursor.executemany("INSERT INTO users (id, name, email, ssn, ssn_hash, address) VALUES (?, ?, ?, ?, ?, ?)", users)
+            cursor.executemany("INSERT INTO tax_records (user_id, year, income, deductions, tax_paid) VALUES (?, ?, ?, ?, ?)",
+                               records)
+            users_done += len(users)
+            records_done += len(records)
+
+            if number % args.commit_every == 0:
+                cursor.execute("COMMIT")
+                cursor.execute("BEGIN")
+
+            elapsed = time.perf_counter() - started
+            print(f"\r{users_done:,}/{args.users:,} users, {records_done:,} tax records "
+                  f"({(users_done + records_done) / elapsed:,.0f} rows/s)", end="", flush=True)
+        cursor.execute("COMMIT")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - started
+    print()
+
+    # Refresh planner statistics, then hand the database back in the
+    # journaling mode the app expects
+    cursor.execute("ANALYZE")
+    cursor.execute("PRAGMA locking_mode=NORMAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+    total = users_done + records_done
+    print(f"Database populated with mock data: {users_done:,} users and {records_done:,} tax records "
+          f"in {elapsed:.1f}s ({total / elapsed if elapsed else total:,.0f} rows/s).")
+
 
-fake = Faker()
-conn = sqlite3.connect("tax_data.db")
-cursor = conn.cursor()
-
-
-cursor.executescript("""
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    email TEXT UNIQUE,
-    ssn TEXT UNIQUE,
-    address TEXT
-);
-
-CREATE TABLE IF NOT EXISTS tax_records (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    year INTEGER,
-    income REAL,
-    deductions REAL,
-    tax_paid REAL,
-    FOREIGN KEY(user_id) REFERENCES users(id)
-);
-""")
-
-for _ in range(10):
-    name = fake.name()
-    email = fake.email()
-    ssn = fake.ssn()
-    address = fake.address()
-    cursor.execute("INSERT INTO users (name, email, ssn, address) VALUES (?, ?, ?, ?)",
-                   (name, email, ssn, address))
-    user_id = cursor.lastrowid
-    for year in range(2020, 2023):
-        income = round(random.uniform(30000, 100000), 2)
-        deductions = round(random.uniform(5000, 20000), 2)
-        tax_paid = income * 0.2 - deductions  
-        cursor.execute("INSERT INTO tax_records (user_id, year, income, deductions, tax_paid) VALUES (?, ?, ?, ?, ?)",
-                       (user_id, year, income, deductions, tax_paid))
-
-conn.commit()
-conn.close()
-print("Database populated with mock data.")
+if __name__ == "__main__":
+    main()
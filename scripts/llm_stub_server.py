@@ -0,0 +1,186 @@
+"""
+Local OpenAI-compatible chat completions server for offline benchmarks.
+
+Serves POST /v1/chat/completions, both plain and streamed (SSE), with a
+configurable time to first token, token rate and injected failures. Point a
+service at it with base_url or XAI_BASE_URL:
+
+    python scripts/llm_stub_server.py --port 8089 --latency-ms 400 --tokens-per-second 60
+    XAI_BASE_URL=http://127.0.0.1:8089/v1 streamlit run app/streamlit_ui.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Rough tokens per character, matching chunking.estimate_tokens' fallback
+CHARS_PER_TOKEN = 4
+
+
+class StubConfig:
+    def __init__(self, latency_ms=200.0, jitter_ms=0.0, tokens_per_second=0.0, completion_tokens=64,
+                 failure_rate=0.0, failure_status=500, seed=None):
+        """
+        :param latency_ms: delay before the first token (or the whole
+            response when not streaming)
+        :param tokens_per_second: generation rate after the first token;
+            0 sends every token at once
+        :param failure_rate: fraction of requests answered with
+            `failure_status` instead of a completion
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+
+def completion_tokens(messages, count):
+    """
+    Token strings for a reply. Prompts that ask for JSON get a JSON object
+    back so extraction and validation paths parse it like a real answer.
+    """
+    words = ["lorem"] * count
+    wants_json = any("JSON" in (message.get("content") or "") for message in messages)
+    if not wants_json:
+        return [word + " " for word in words]
+    fields = [f'"field_{index}": "value {index}"' for index in range(max(1, count // 4))]
+    return ["{"] + [field + (", " if index < len(fields) - 1 else "") for index, field in enumerate(fields)] + ["}"]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        request = json.loads(body or b"{}")
+        config = self.config
+        time.sleep(config.first_token_delay())
+        if config.should_fail():
+            self._send_json(config.failure_status, {
+                "error": {"message": "Injected failure", "type": "server_error", "code": config.failure_status}
+            })
+            return
+
+        messages = request.get("messages", [])
+        tokens = completion_tokens(messages, config.completion_tokens)
+        usage = {
+            "prompt_tokens": sum(len(m.get("content") or "") for m in messages) // CHARS_PER_TOKEN,
+            "completion_tokens": len(tokens),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "created": int(time.time()),
+            "model": request.get("model", "grok-beta"),
+        }
+
+        if request.get("stream"):
+            self._stream(base, tokens, usage)
+            return
+
+        time.sleep(config.token_delay() * len(tokens))
+        self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": "stop",
+        }]))
+
+    def _stream(self, base, tokens, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(chunk):
+            self.wfile.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            self.wfile.flush()
+
+        delay = self.config.token_delay()
+        for index, token in enumerate(tokens):
+            if index and delay:
+                time.sleep(delay)
+            delta = {"content": token} if index else {"role": "assistant", "content": token}
+            send(dict(base, object="chat.completion.chunk",
+                      choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+        send(dict(base, object="chat.completion.chunk", usage=usage,
+                  choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=0, config=None):
+    """
+    Build (but do not start) a stub server. Port 0 picks a free port;
+    read it back from server.server_address.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="0 = no generation delay")
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.tokens_per_second, args.completion_tokens,
+                        args.failure_rate, args.failure_status, args.seed)
+    server = make_server(args.host, args.port, config)
+    host, port = server.server_address[:2]
+    print(f"Stub LLM server on http://{host}:{port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()